@@ -22,8 +22,20 @@ class Config(BaseConfig):
 
     ACCESS_TOKEN_EXPIRE: int = Field(env='ACCESS_TOKEN_EXPIRE', default=3600)
     RESET_TOKEN_EXPIRE: int = Field(env='ACCESS_TOKEN_EXPIRE', default=60*60*24*3)  # 3 days
+    # Embed signed person/email snapshots in access tokens so authenticated requests skip those lookups
+    ACCESS_TOKEN_SNAPSHOT: bool = Field(env='ACCESS_TOKEN_SNAPSHOT', default=False)
+    ACCESS_TOKEN_CACHE_MAXSIZE: int = Field(env='ACCESS_TOKEN_CACHE_MAXSIZE', default=10000)  # 0 disables the cache
 
     MIME_TYPE: str = 'application/json'
+    # Response serializer: orjson (falls back to json when the orjson package is missing) or json
+    JSON_PROVIDER: str = Field(env='JSON_PROVIDER', default='orjson')
+    # Response compression, negotiated from Accept-Encoding in this order of preference; br and zstd need the
+    # brotli and zstandard packages. An empty list disables compression.
+    COMPRESSION_ENCODINGS: str = Field(env='COMPRESSION_ENCODINGS', default='zstd,br,gzip')
+    COMPRESSION_MIN_SIZE: int = Field(env='COMPRESSION_MIN_SIZE', default=1024)  # bytes
+    COMPRESSION_GZIP_LEVEL: int = Field(env='COMPRESSION_GZIP_LEVEL', default=6)
+    COMPRESSION_BROTLI_LEVEL: int = Field(env='COMPRESSION_BROTLI_LEVEL', default=4)
+    COMPRESSION_ZSTD_LEVEL: int = Field(env='COMPRESSION_ZSTD_LEVEL', default=3)
 
     SECRET_KEY: str = Field(env='SECRET_KEY', default=None)
     SECURITY_PASSWORD_SALT: str = Field(env='SECURITY_PASSWORD_SALT', default=None)
@@ -41,11 +53,59 @@ class Config(BaseConfig):
     RABBITMQ_VIRTUAL_HOST: str = Field(env='RABBITMQ_VIRTUAL_HOST', default='/')
     RABBITMQ_USER: str = Field(env='RABBITMQ_USER')
     RABBITMQ_PASSWORD: str = Field(env='RABBITMQ_PASSWORD')
+    RABBITMQ_CHANNEL_POOL_SIZE: int = Field(env='RABBITMQ_CHANNEL_POOL_SIZE', default=4)
+    RABBITMQ_CHANNEL_POOL_TIMEOUT: float = Field(env='RABBITMQ_CHANNEL_POOL_TIMEOUT', default=10)
+    # Wait for the broker to confirm every publish; slower, but a message is never silently lost
+    RABBITMQ_PUBLISHER_CONFIRMS: bool = Field(env='RABBITMQ_PUBLISHER_CONFIRMS', default=False)
+    # Body encoding of published messages: json, json+gzip or msgpack (needs the msgpack package)
+    RABBITMQ_MESSAGE_ENCODING: str = Field(env='RABBITMQ_MESSAGE_ENCODING', default='json')
+    RABBITMQ_SOCKET_TIMEOUT: float = Field(env='RABBITMQ_SOCKET_TIMEOUT', default=5)
+    RABBITMQ_BREAKER_FAILURE_THRESHOLD: int = Field(env='RABBITMQ_BREAKER_FAILURE_THRESHOLD', default=3)
+    RABBITMQ_BREAKER_RESET_TIMEOUT: float = Field(env='RABBITMQ_BREAKER_RESET_TIMEOUT', default=30)
+    # Messages that cannot be published are appended here and replayed in the background; empty disables it
+    RABBITMQ_SPOOL_PATH: str = Field(env='RABBITMQ_SPOOL_PATH', default='message_spool.jsonl')
+    RABBITMQ_SPOOL_REPLAY_INTERVAL: float = Field(env='RABBITMQ_SPOOL_REPLAY_INTERVAL', default=5)
 
     AUTH_JWT_SECRET: str = Field(env='AUTH_JWT_SECRET')
 
     ROLLBAR_ACCESS_TOKEN: str = Field(env='ROLLBAR_ACCESS_TOKEN', default=None)
 
+    ENTITY_CACHE_MAXSIZE: int = Field(env='ENTITY_CACHE_MAXSIZE', default=10000)
+    ENTITY_CACHE_TTL: int = Field(env='ENTITY_CACHE_TTL', default=300)
+
+    MEMBERSHIP_CACHE_MAXSIZE: int = Field(env='MEMBERSHIP_CACHE_MAXSIZE', default=10000)
+    MEMBERSHIP_CACHE_TTL: int = Field(env='MEMBERSHIP_CACHE_TTL', default=60)
+
+    # Password hashing runs in this many worker processes (0 hashes on the request thread)
+    PASSWORD_HASHER_WORKERS: int = Field(env='PASSWORD_HASHER_WORKERS', default=2)
+    PASSWORD_HASHER_QUEUE_TIMEOUT: float = Field(env='PASSWORD_HASHER_QUEUE_TIMEOUT', default=5)
+    # Seconds between log lines with the hasher's queue depth and latency stats; 0 disables them
+    PASSWORD_HASHER_STATS_LOG_INTERVAL: float = Field(env='PASSWORD_HASHER_STATS_LOG_INTERVAL', default=60)
+    # werkzeug hash method, e.g. scrypt:32768:8:1; pick one with python -m common.utils.calibrate_password_hasher
+    PASSWORD_HASH_METHOD: str = Field(env='PASSWORD_HASH_METHOD', default='scrypt')
+
+    # Email events go through the outbox table and are published by `python -m common.tasks.outbox_relay`
+    EMAIL_OUTBOX_ENABLED: bool = Field(env='EMAIL_OUTBOX_ENABLED', default=True)
+    OUTBOX_BATCH_SIZE: int = Field(env='OUTBOX_BATCH_SIZE', default=100)
+    OUTBOX_POLL_INTERVAL: float = Field(env='OUTBOX_POLL_INTERVAL', default=1)
+    OUTBOX_LEASE_SECONDS: int = Field(env='OUTBOX_LEASE_SECONDS', default=60)
+    OUTBOX_RETRY_DELAY: int = Field(env='OUTBOX_RETRY_DELAY', default=30)
+    OUTBOX_MAX_ATTEMPTS: int = Field(env='OUTBOX_MAX_ATTEMPTS', default=20)
+    OUTBOX_RETENTION_DAYS: int = Field(env='OUTBOX_RETENTION_DAYS', default=7)
+
+    # How saves copy previous versions to the audit tables: sync, trigger or deferred (see common.repositories.audit)
+    AUDIT_STRATEGY: str = Field(env='AUDIT_STRATEGY', default='sync')
+    AUDIT_DEFERRED_BATCH_SIZE: int = Field(env='AUDIT_DEFERRED_BATCH_SIZE', default=500)
+    AUDIT_DEFERRED_FLUSH_INTERVAL: float = Field(env='AUDIT_DEFERRED_FLUSH_INTERVAL', default=1)
+    # Audit partition maintenance (common/tasks/maintain_audit_partitions.py); 0 disables retention and compaction
+    AUDIT_PARTITIONS_AHEAD: int = Field(env='AUDIT_PARTITIONS_AHEAD', default=3)
+    AUDIT_RETENTION_MONTHS: int = Field(env='AUDIT_RETENTION_MONTHS', default=0)
+    AUDIT_COMPACT_AFTER_MONTHS: int = Field(env='AUDIT_COMPACT_AFTER_MONTHS', default=0)
+    AUDIT_ARCHIVE_DIR: str = Field(env='AUDIT_ARCHIVE_DIR', default='')
+
+    # Rows fetched per round trip by the server-side cursor of GET /todo/export
+    TODO_EXPORT_FETCH_SIZE: int = Field(env='TODO_EXPORT_FETCH_SIZE', default=1000)
+
     QUEUE_NAME_PREFIX: str = Field(env='QUEUE_NAME_PREFIX', default='')
     EMAIL_SERVICE_PROCESSOR_QUEUE_NAME: str = Field(env='EmailServiceProcessor_QUEUE_NAME', default='email-transmitter')
 
@@ -3,4 +3,5 @@ from .person_organization_role import PersonOrganizationRole
 from .organization import Organization
 from .login_method import LoginMethod
 from .email import Email
-from .todo import Todo
\ No newline at end of file
+from .todo import Todo
+from .outbox_message import OutboxMessage
\ No newline at end of file
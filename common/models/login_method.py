@@ -2,12 +2,12 @@ from dataclasses import dataclass, field
 from typing import Optional
 import string
 
-from werkzeug.security import generate_password_hash
-
 from rococo.models.login_method import LoginMethodType
 from rococo.models.versioned_model import ModelValidationError
 from rococo.models import LoginMethod as BaseLoginMethod
 
+from common.utils.password_hasher import password_hasher
+
 
 @dataclass
 class LoginMethod(BaseLoginMethod):
@@ -21,7 +21,7 @@ class LoginMethod(BaseLoginMethod):
     def hash_password(self):
         if self.raw_password is not None:
             self.validate_raw_password()
-            self.password = generate_password_hash(self.raw_password, method='scrypt')
+            self.password = password_hasher.hash(self.raw_password)
         del self.raw_password
 
     def validate_raw_password(self):
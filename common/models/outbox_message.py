@@ -0,0 +1,17 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from rococo.models import VersionedModel
+from typing import ClassVar, Optional
+
+
+@dataclass
+class OutboxMessage(VersionedModel):
+    """A message waiting in the outbox_message table to be published by the outbox relay."""
+    use_type_checking: ClassVar[bool] = True
+
+    queue_name: str = field(default=None)
+    exchange_name: Optional[str] = field(default=None)
+    payload: dict = field(default_factory=dict)
+    attempts: int = field(default=0)
+    published_on: Optional[datetime] = field(default=None)
+    last_error: Optional[str] = field(default=None)
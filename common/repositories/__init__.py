@@ -3,4 +3,5 @@ from .email import EmailRepository
 from .organization import OrganizationRepository
 from .login_method import LoginMethodRepository
 from .person_organization_role import PersonOrganizationRoleRepository
-from .todo import TodoRepository
\ No newline at end of file
+from .todo import TodoRepository
+from .outbox import OutboxRepository
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""
+Audit strategies: how a save of an existing entity copies the previous version of its row to `{table}_audit`.
+
+    sync      An INSERT ... SELECT of the current row is sent with the save (rococo's own behaviour).
+    trigger   The audit_previous_version trigger copies the old row inside the UPDATE, so the client only
+              sends the save. The trigger only acts in transactions that SET LOCAL app.audit_trigger = 'on',
+              which saves do in this mode, so writes under the other strategies are not audited twice.
+    deferred  The save statement also returns the old rows. They are buffered in the process and inserted
+              in batches by a background thread. Buffered rows are lost if the process dies.
+
+Chosen with AUDIT_STRATEGY.
+
+The audit tables are partitioned by month of changed_on; `AuditPartitionManager` creates, retires and
+compacts the partitions.
+"""
+import atexit
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from common.app_config import config
+from common.app_logger import logger
+
+SYNC = 'sync'
+TRIGGER = 'trigger'
+DEFERRED = 'deferred'
+STRATEGIES = (SYNC, TRIGGER, DEFERRED)
+
+AUDITED_TABLES = ['organization', 'person', 'email', 'login_method', 'person_organization_role', 'todo']
+
+
+class AuditCapture(tuple):
+    """A (query, values) pair whose result rows are previous versions for the audit table of `table_name`."""
+
+    def __new__(cls, query: str, values: tuple, table_name: str):
+        capture = super().__new__(cls, (query, values))
+        capture.table_name = table_name
+        return capture
+
+
+def get_audit_strategy() -> str:
+    strategy = config.AUDIT_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown audit strategy '{strategy}', expected one of {STRATEGIES}.")
+    return strategy
+
+
+def get_save_many_queries(table_name: str, entity_ids: List[str], upsert_query: str, upsert_values: tuple) -> list:
+    """The statements that upsert rows of `table_name` and audit the previous versions of `entity_ids`."""
+    strategy = get_audit_strategy()
+    if strategy == TRIGGER:
+        return [("SET LOCAL app.audit_trigger = 'on'", ()), (upsert_query, upsert_values)]
+
+    if strategy == DEFERRED:
+        # Every part of the statement sees the same snapshot, so `previous` holds the rows as they were.
+        query = (
+            f"WITH previous AS (SELECT {table_name}.* FROM {table_name} WHERE entity_id = ANY(%s) FOR UPDATE), "
+            f"saved AS ({upsert_query} RETURNING 1) "
+            f"SELECT * FROM previous"
+        )
+        return [AuditCapture(query, (entity_ids,) + tuple(upsert_values), table_name)]
+
+    return [
+        (f"INSERT INTO {table_name}_audit (SELECT * FROM {table_name} WHERE entity_id = ANY(%s))", (entity_ids,)),
+        (upsert_query, upsert_values),
+    ]
+
+
+def group_round_trips(queries: list) -> list:
+    """
+    Join queries into as few round trips as possible, each a (query, values) pair.
+
+    Only the rows of the last statement of a round trip can be read, so every capture ends one.
+    """
+    round_trips, pending = [], []
+    for query in queries + [None]:
+        if query is not None:
+            pending.append(query)
+        if pending and (query is None or isinstance(query, AuditCapture)):
+            joined = (";\n".join(text for text, _ in pending), tuple(value for _, values in pending for value in values))
+            if isinstance(query, AuditCapture):
+                joined = AuditCapture(*joined, table_name=query.table_name)
+            round_trips.append(joined)
+            pending = []
+    return round_trips
+
+
+def _encode(value):
+    return json.dumps(value) if isinstance(value, dict) else value
+
+
+class DeferredAuditWriter:
+    """
+    Buffers previous versions and inserts them into the audit tables in batches.
+
+    A background thread flushes every `flush_interval` seconds, or as soon as `batch_size` rows are waiting.
+    It uses its own connections, so it works outside of requests. Rows that fail to insert are kept for the
+    next flush. A retried row keeps its changed_on, so the (entity_id, version, changed_on) primary key still
+    makes sure it is inserted at most once.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._rows: Dict[str, List[Dict[str, Any]]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._adapter = None
+
+    def add(self, table_name: str, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        with self._lock:
+            self._rows.setdefault(table_name, []).extend(rows)
+            self._count += len(rows)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='deferred-audit-writer', daemon=True)
+                self._thread.start()
+            if self._count >= self.batch_size:
+                self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return self._count
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing deferred audit rows failed")
+
+    def flush(self) -> int:
+        """Insert every buffered row. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                buffered, self._rows, self._count = self._rows, {}, 0
+            if not buffered:
+                return 0
+
+            try:
+                self._write(buffered)
+            except Exception:
+                with self._lock:
+                    for table_name, rows in buffered.items():
+                        self._rows[table_name] = rows + self._rows.get(table_name, [])
+                        self._count += len(rows)
+                raise
+            return sum(len(rows) for rows in buffered.values())
+
+    def _write(self, buffered: Dict[str, List[Dict[str, Any]]]):
+        if self._adapter is None:
+            from common.repositories.factory import RepositoryFactory
+            self._adapter = RepositoryFactory(config).get_db_connection()
+
+        queries = []
+        for table_name, rows in buffered.items():
+            columns = list(rows[0])
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                row_placeholder = f"({', '.join(['%s'] * len(columns))})"
+                queries.append((
+                    f"INSERT INTO {table_name}_audit ({', '.join(columns)}) "
+                    f"VALUES {', '.join([row_placeholder] * len(batch))} ON CONFLICT DO NOTHING",
+                    tuple(_encode(row[column]) for row in batch for column in columns)
+                ))
+
+        with self._adapter:
+            try:
+                for query, values in queries:
+                    self._adapter._cursor.execute(query, values)
+                self._adapter._connection.commit()
+            except Exception:
+                self._adapter._connection.rollback()
+                raise
+
+
+_deferred_writer = None
+_deferred_writer_lock = threading.Lock()
+
+
+def get_deferred_audit_writer() -> DeferredAuditWriter:
+    global _deferred_writer
+    if _deferred_writer is None:
+        with _deferred_writer_lock:
+            if _deferred_writer is None:
+                _deferred_writer = DeferredAuditWriter(
+                    batch_size=config.AUDIT_DEFERRED_BATCH_SIZE,
+                    flush_interval=config.AUDIT_DEFERRED_FLUSH_INTERVAL
+                )
+                atexit.register(_flush_at_exit)
+    return _deferred_writer
+
+
+def _flush_at_exit():
+    try:
+        _deferred_writer.flush()
+    except Exception:
+        logger.exception(f"Could not flush {_deferred_writer.pending} deferred audit rows at exit")
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _current_month() -> date:
+    # changed_on is stored in UTC.
+    return datetime.now(timezone.utc).date().replace(day=1)
+
+
+class AuditPartitionManager:
+    """
+    Maintains the monthly partitions of the audit tables, named {table}_audit_pYYYYMM.
+
+    Rows without a partition of their own go to {table}_audit_default. Creating a partition moves the rows of
+    its month out of the default partition, so partitions can always be added, also for past months.
+    Every partition is changed in its own transaction.
+    """
+
+    def __init__(self, adapter=None):
+        if adapter is None:
+            from common.repositories.factory import RepositoryFactory
+            adapter = RepositoryFactory(config).get_db_connection()
+        self.adapter = adapter
+
+    def _run(self, queries: list, fetch: bool = False) -> Optional[list]:
+        with self.adapter:
+            try:
+                rows = None
+                for query, values in queries:
+                    self.adapter._cursor.execute(query, values)
+                if fetch:
+                    rows = self.adapter._cursor.fetchall()
+                self.adapter._connection.commit()
+                return rows
+            except Exception:
+                self.adapter._connection.rollback()
+                raise
+
+    def get_partitions(self, table_name: str) -> Dict[date, str]:
+        """The monthly partitions of the audit table of `table_name`, by month."""
+        rows = self._run([(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass",
+            (f"{table_name}_audit",)
+        )], fetch=True)
+        pattern = re.compile(rf'^{table_name}_audit_p(\d{{4}})(\d{{2}})$')
+        partitions = {}
+        for (name,) in rows:
+            match = pattern.match(name)
+            if match:
+                partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+        return partitions
+
+    def create_partitions(self, table_name: str, months_ahead: int) -> List[str]:
+        """
+        Create the partitions from this month up to `months_ahead` months ahead, and one for every month that
+        has rows in the default partition. Returns the names of the created partitions.
+        """
+        audit_table = f"{table_name}_audit"
+        current_month = _current_month()
+        months = {_add_months(current_month, offset) for offset in range(months_ahead + 1)}
+        rows = self._run([(
+            f"SELECT DISTINCT date_trunc('month', changed_on)::date FROM {audit_table}_default", ()
+        )], fetch=True)
+        months.update(month for (month,) in rows)
+
+        existing = self.get_partitions(table_name)
+        created = []
+        for month in sorted(months - set(existing)):
+            name = f"{audit_table}_p{month:%Y%m}"
+            lower, upper = month, _add_months(month, 1)
+            self._run([
+                (f"CREATE TABLE {name} (LIKE {audit_table} INCLUDING DEFAULTS)", ()),
+                (
+                    f"WITH moved AS (DELETE FROM {audit_table}_default WHERE changed_on >= %s AND changed_on < %s "
+                    f"RETURNING *) INSERT INTO {name} SELECT * FROM moved",
+                    (lower, upper)
+                ),
+                (f"ALTER TABLE {audit_table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (lower, upper)),
+            ])
+            created.append(name)
+        return created
+
+    def retire_partitions(self, table_name: str, retention_months: int, archive_dir: str = None) -> List[str]:
+        """
+        Drop the partitions of months that ended more than `retention_months` months ago. With `archive_dir` each
+        one is first written to {archive_dir}/{partition}.csv.gz. Returns the names of the dropped partitions.
+        """
+        cutoff = _add_months(_current_month(), -retention_months)
+        retired = []
+        for month, name in sorted(self.get_partitions(table_name).items()):
+            if month >= cutoff:
+                continue
+            # Archived while still attached, so a failed export leaves the partition in place for the next run.
+            if archive_dir:
+                self._archive(name, archive_dir)
+            self._run([
+                (f"ALTER TABLE {table_name}_audit DETACH PARTITION {name}", ()),
+                (f"DROP TABLE {name}", ()),
+            ])
+            retired.append(name)
+        return retired
+
+    def _archive(self, partition_name: str, archive_dir: str):
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"{partition_name}.csv.gz")
+        # Written to a temporary file first, so an interrupted export never looks like a complete archive.
+        with gzip.open(f"{path}.tmp", 'wb') as archive:
+            with self.adapter:
+                self.adapter._cursor.copy_expert(f"COPY {partition_name} TO STDOUT WITH CSV HEADER", archive)
+        os.replace(f"{path}.tmp", path)
+
+    def compact_partitions(self, table_name: str, after_months: int) -> Dict[str, int]:
+        """
+        In the partitions of months that ended more than `after_months` months ago, keep only the last version
+        of every entity in that month. Returns the number of deleted versions per partition.
+        """
+        cutoff = _add_months(_current_month(), -after_months)
+        deleted = {}
+        for month, name in sorted(self.get_partitions(table_name).items()):
+            if month >= cutoff:
+                continue
+            rows = self._run([(
+                f"WITH deleted AS (DELETE FROM {name} WHERE (entity_id, version) IN ("
+                f"SELECT entity_id, version FROM (SELECT entity_id, version, row_number() OVER ("
+                f"PARTITION BY entity_id ORDER BY changed_on DESC, version DESC) AS position FROM {name}) versions "
+                f"WHERE position > 1) RETURNING 1) SELECT count(*) FROM deleted",
+                ()
+            )], fetch=True)
+            deleted[name] = rows[0][0]
+        return deleted
@@ -1,20 +1,333 @@
+import copy
+import json
+import re
+import threading
+import uuid
+
 from rococo.repositories.postgresql import PostgreSQLRepository
+from rococo.repositories.postgresql.postgresql_repository import adjust_conditions
 from rococo.data.postgresql import PostgreSQLAdapter
 from rococo.messaging.base import MessageAdapter
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional
+
+from common.app_config import config
+from common.repositories.audit import SYNC, AuditCapture, get_audit_strategy, get_deferred_audit_writer, get_save_many_queries
+from common.utils.cache import LRUCache
+
+_IDENTIFIER_RE = re.compile(r'^[a-z_][a-z0-9_]*$')
+_entity_cache_lock = threading.Lock()
 
 
 class BaseRepository(PostgreSQLRepository):
     MODEL = None
 
+    # Set to True to serve get_one({"entity_id": ...}) lookups from an in-process read-through cache.
+    USE_ENTITY_CACHE = False
+
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
         if cls.MODEL is None:
             raise TypeError(f"Subclasses of {cls.__name__} must define the MODEL attribute.")
 
     def __init__(
-            self, db_adapter: PostgreSQLAdapter, message_adapter: Optional[MessageAdapter], 
+            self, db_adapter: PostgreSQLAdapter, message_adapter: Optional[MessageAdapter],
             queue_name: str, user_id: str = None
     ):
         # Pass MODEL as the model to the BaseRepository
         super().__init__(db_adapter, self.MODEL, message_adapter, queue_name, user_id=user_id)
+
+    @classmethod
+    def get_entity_cache(cls) -> Optional[LRUCache]:
+        """Return the entity cache shared by all instances of this repository, or None if it does not use one."""
+        if not cls.USE_ENTITY_CACHE:
+            return None
+
+        cache = cls.__dict__.get('_entity_cache')
+        if cache is None:
+            with _entity_cache_lock:
+                cache = cls.__dict__.get('_entity_cache')
+                if cache is None:
+                    cache = LRUCache(maxsize=config.ENTITY_CACHE_MAXSIZE, ttl=config.ENTITY_CACHE_TTL)
+                    cls._entity_cache = cache
+        return cache
+
+    @classmethod
+    def get_entity_cache_stats(cls) -> Optional[dict]:
+        cache = cls.get_entity_cache()
+        return cache.stats() if cache is not None else None
+
+    def _invalidate_entity_cache(self, *entity_ids):
+        cache = self.get_entity_cache()
+        if cache is not None:
+            cache.delete(*(str(entity_id) for entity_id in entity_ids))
+
+    def get_one(self, conditions: Dict[str, Any] = None, fetch_related: List[str] = None):
+        if (
+            self.get_entity_cache() is not None and not fetch_related
+            and conditions and list(conditions) == ['entity_id']
+        ):
+            return self.get_by_id(conditions['entity_id'])
+        return super().get_one(conditions, fetch_related)
+
+    def get_by_id(self, entity_id: str, version: str = None):
+        """
+        Get an active entity by its entity_id, through the entity cache when the repository uses one.
+
+        When `version` is given, a cached copy of another version is ignored and the entity is reloaded.
+        """
+        cache = self.get_entity_cache()
+        if cache is None:
+            return super().get_one({'entity_id': entity_id})
+
+        key = str(entity_id)
+        cached = cache.get(key)
+        if cached is not None and (version is None or cached.version == version):
+            # Callers may modify what they get, so the cached instance is never handed out.
+            return copy.copy(cached)
+
+        generation = cache.generation
+        instance = super().get_one({'entity_id': entity_id})
+        if instance is not None:
+            cache.set(key, copy.copy(instance), generation=generation)
+        return instance
+
+    def save(self, instance, send_message: bool = False):
+        try:
+            if get_audit_strategy() == SYNC:
+                return super().save(instance, send_message=send_message)
+
+            data = self._process_data_before_save(instance)
+            self._run_transaction(self._get_save_many_queries([data]))
+            if send_message:
+                message = json.dumps(instance.as_dict(convert_datetime_to_iso_string=True))
+                self.message_adapter.send_message(self.queue_name, message)
+            return instance
+        finally:
+            self._invalidate_entity_cache(instance.entity_id)
+
+    def _build_where_clause(self, conditions: Dict[str, Any] = None, active: bool = True):
+        """Build a WHERE clause and its params from a conditions dict, the same way the adapter does."""
+        condition_strs_values = []
+        if conditions:
+            conditions = adjust_conditions(dict(conditions))
+            condition_strs_values = [
+                self.adapter._build_condition_string(self.table_name, key, value)
+                for key, value in conditions.items()
+            ]
+        if active:
+            condition_strs_values.append((f"{self.table_name}.active = %s", ['true']))
+
+        if not condition_strs_values:
+            return "", ()
+
+        clause = " WHERE " + " AND ".join(condition_str for condition_str, _ in condition_strs_values)
+        params = tuple(sum((condition_values for _, condition_values in condition_strs_values), []))
+        return clause, params
+
+    def _validate_column(self, column: str):
+        if column not in self.model.fields():
+            raise ValueError(f"'{column}' is not a column of {self.table_name}.")
+
+    def count(self, conditions: Dict[str, Any] = None, active: bool = True) -> int:
+        """Count records matching the given conditions with a single COUNT(*) query."""
+        where_clause, params = self._build_where_clause(conditions, active=active)
+        query = f"SELECT COUNT(*) AS count FROM {self.table_name}{where_clause}"
+
+        with self.adapter:
+            results = self.adapter.execute_query(query, params)
+        return results[0]['count'] if results else 0
+
+    def count_filtered(
+            self, filters: Dict[str, Dict[str, Any]], conditions: Dict[str, Any] = None, active: bool = True
+    ) -> Dict[str, int]:
+        """
+        Count several subsets of the records matching `conditions` in one round trip.
+
+        `filters` maps a result label to a conditions dict, e.g.
+        {"completed": {"is_completed": True}, "incomplete": {"is_completed": False}}.
+        Every label is computed as COUNT(*) FILTER (WHERE ...); an empty conditions dict counts all matches.
+        """
+        select_strs, select_params = [], ()
+        for label, filter_conditions in filters.items():
+            if not _IDENTIFIER_RE.match(label):
+                raise ValueError(f"Invalid count label '{label}'.")
+            filter_clause, filter_params = self._build_where_clause(filter_conditions, active=False)
+            if filter_clause:
+                select_strs.append(f"COUNT(*) FILTER ({filter_clause.strip()}) AS {label}")
+            else:
+                select_strs.append(f"COUNT(*) AS {label}")
+            select_params += filter_params
+
+        where_clause, params = self._build_where_clause(conditions, active=active)
+        query = f"SELECT {', '.join(select_strs)} FROM {self.table_name}{where_clause}"
+
+        with self.adapter:
+            results = self.adapter.execute_query(query, select_params + params)
+        row = results[0] if results else {}
+        return {label: row.get(label) or 0 for label in filters}
+
+    def count_grouped(
+            self, group_by: List[str], conditions: Dict[str, Any] = None, active: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Count records matching `conditions` grouped by the given columns. Each row carries the group columns and `count`."""
+        for column in group_by:
+            self._validate_column(column)
+
+        columns = ', '.join(f"{self.table_name}.{column}" for column in group_by)
+        where_clause, params = self._build_where_clause(conditions, active=active)
+        query = f"SELECT {columns}, COUNT(*) AS count FROM {self.table_name}{where_clause} GROUP BY {columns}"
+
+        with self.adapter:
+            results = self.adapter.execute_query(query, params)
+        return results or []
+
+    def get_many_after(
+            self, order_by: List[str], after: Optional[tuple] = None, conditions: Dict[str, Any] = None,
+            limit: int = None, active: bool = True
+    ) -> List[Any]:
+        """
+        Keyset pagination: get records ordered ascending by `order_by` that come strictly after the `after` key.
+
+        `after` holds one value per `order_by` column, taken from the last record of the previous page.
+        """
+        for column in order_by:
+            self._validate_column(column)
+
+        where_clause, params = self._build_where_clause(conditions, active=active)
+        if after is not None:
+            if len(after) != len(order_by):
+                raise ValueError("The keyset must have one value per order_by column.")
+            columns = ', '.join(f"{self.table_name}.{column}" for column in order_by)
+            placeholders = ', '.join(['%s'] * len(after))
+            where_clause += f"{' AND' if where_clause else ' WHERE'} ({columns}) > ({placeholders})"
+            params += tuple(after)
+
+        order_clause = ', '.join(f"{self.table_name}.{column} ASC" for column in order_by)
+        query = f"SELECT {self.table_name}.* FROM {self.table_name}{where_clause} ORDER BY {order_clause}"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+
+        with self.adapter:
+            records = self.adapter.execute_query(query, params)
+        return [self.model.from_dict(record) for record in records or []]
+
+    def iter_many(
+            self, conditions: Dict[str, Any] = None, order_by: List[str] = None, fetch_size: int = 1000,
+            active: bool = True
+    ) -> Iterator[Any]:
+        """
+        Iterate over the records matching `conditions`, ordered ascending by `order_by`, without loading them all.
+
+        Rows come from a server-side (named) cursor, `fetch_size` at a time, so memory stays bounded by one batch
+        however many rows match. The cursor lives in the connection's transaction and is closed when the iteration
+        ends or the generator is closed. Do not run other queries through this adapter on the same thread until
+        then: without a connection pool, leaving their `with self.adapter` block closes the connection.
+        """
+        for column in order_by or []:
+            self._validate_column(column)
+
+        where_clause, params = self._build_where_clause(conditions, active=active)
+        query = f"SELECT {self.table_name}.* FROM {self.table_name}{where_clause}"
+        if order_by:
+            query += " ORDER BY " + ', '.join(f"{self.table_name}.{column} ASC" for column in order_by)
+
+        with self.adapter:
+            cursor = self.adapter._connection.cursor(name=f"{self.table_name}_iter_{uuid.uuid4().hex}")
+            try:
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    column_names = [desc[0] for desc in cursor.description]
+                    for row in rows:
+                        yield self.model.from_dict(dict(zip(column_names, row)))
+            finally:
+                cursor.close()
+
+    def _get_save_many_queries(self, data_list: List[Dict[str, Any]]):
+        """Return the queries that save all rows of `data_list` with a multi-row upsert, audited per AUDIT_STRATEGY."""
+        entity_ids = [data['entity_id'] for data in data_list]
+        insert_query, values = self._get_insert_many_query(data_list)
+        update_columns = ', '.join(f"{column} = EXCLUDED.{column}" for column in data_list[0] if column != 'entity_id')
+        upsert_query = f"{insert_query} ON CONFLICT (entity_id) DO UPDATE SET {update_columns}"
+        return get_save_many_queries(self.table_name, entity_ids, upsert_query, values)
+
+    def _get_insert_many_query(self, data_list: List[Dict[str, Any]]):
+        """Return a multi-row INSERT query for rows that do not exist yet, so there is nothing to audit."""
+        columns = list(data_list[0].keys())
+        row_placeholder = f"({', '.join(['%s'] * len(columns))})"
+        query = (
+            f"INSERT INTO {self.table_name} ({', '.join(columns)}) "
+            f"VALUES {', '.join([row_placeholder] * len(data_list))}"
+        )
+        return query, tuple(data[column] for data in data_list for column in columns)
+
+    def _run_transaction(self, queries: list):
+        """
+        Run the queries in a single transaction, rolling back the connection if any of them fails.
+
+        The previous versions returned by deferred audit captures go to the deferred audit writer once committed.
+        """
+        captured = []
+        with self.adapter:
+            try:
+                for query in queries:
+                    sql, values = query if isinstance(query, tuple) else (query, ())
+                    # Like the adapter's run_transaction, dicts are written as JSON.
+                    self.adapter._cursor.execute(sql, [json.dumps(value) if isinstance(value, dict) else value for value in values])
+                    if isinstance(query, AuditCapture):
+                        column_names = [desc[0] for desc in self.adapter._cursor.description]
+                        rows = [dict(zip(column_names, row)) for row in self.adapter._cursor.fetchall()]
+                        captured.append((query.table_name, rows))
+                self.adapter._connection.commit()
+            except Exception:
+                self.adapter._connection.rollback()
+                raise
+
+        for table_name, rows in captured:
+            get_deferred_audit_writer().add(table_name, rows)
+
+    def _execute_returning(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """Run a data-modifying statement with a RETURNING clause and commit it; execute_query only fetches SELECTs."""
+        with self.adapter:
+            try:
+                self.adapter._cursor.execute(query, params)
+                column_names = [desc[0] for desc in self.adapter._cursor.description]
+                rows = [dict(zip(column_names, row)) for row in self.adapter._cursor.fetchall()]
+                self.adapter._connection.commit()
+            except Exception:
+                self.adapter._connection.rollback()
+                raise
+        return rows
+
+    def save_many(self, instances: List[Any], batch_size: int = 1000) -> List[Any]:
+        """
+        Save many instances in one transaction.
+
+        Every batch of `batch_size` rows costs one multi-row upsert, plus an audit INSERT ... SELECT with the sync
+        audit strategy.
+        """
+        if not instances:
+            return instances
+
+        entity_ids = [instance.entity_id for instance in instances]
+        if len(set(entity_ids)) != len(entity_ids):
+            raise ValueError("Cannot save the same entity more than once in a batch.")
+
+        data_list = [self._process_data_before_save(instance) for instance in instances]
+        queries = []
+        for start in range(0, len(data_list), batch_size):
+            queries += self._get_save_many_queries(data_list[start:start + batch_size])
+
+        try:
+            self._run_transaction(queries)
+        finally:
+            self._invalidate_entity_cache(*entity_ids)
+        return instances
+
+    def delete_many(self, instances: List[Any], batch_size: int = 1000) -> List[Any]:
+        """Soft delete many instances in one transaction."""
+        for instance in instances:
+            instance.active = False
+        return self.save_many(instances, batch_size=batch_size)
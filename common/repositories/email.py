@@ -4,3 +4,4 @@ from common.models.email import Email
 
 class EmailRepository(BaseRepository):
     MODEL = Email
+    USE_ENTITY_CACHE = True
@@ -1,10 +1,15 @@
 from common.repositories import *
+from common.repositories.base import BaseRepository
 from enum import Enum, auto
 from rococo.data.postgresql import PostgreSQLAdapter
+from rococo.messaging.base import MessageAdapter
 from rococo.messaging.rabbitmq import RabbitMqConnection
-from typing import Optional
+from typing import Callable, Optional
 from common.app_logger import logger
 
+import copy
+import threading
+
 
 def get_flask_pooled_db():
     """
@@ -63,6 +68,108 @@ class RepoType(Enum):
     LOGIN_METHOD = auto()
     PERSON_ORGANIZATION_ROLE = auto()
     TODO = auto()
+    OUTBOX = auto()
+
+
+class ThreadLocalPostgreSQLAdapter(PostgreSQLAdapter):
+    """PostgreSQLAdapter that keeps its connection and cursor per thread, so one instance can be shared by all threads."""
+
+    def __init__(self, *args, **kwargs):
+        self._local = threading.local()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def _connection(self):
+        return getattr(self._local, 'connection', None)
+
+    @_connection.setter
+    def _connection(self, connection):
+        self._local.connection = connection
+
+    @property
+    def _cursor(self):
+        return getattr(self._local, 'cursor', None)
+
+    @_cursor.setter
+    def _cursor(self, cursor):
+        self._local.cursor = cursor
+
+
+class LazyMessageAdapter(MessageAdapter):
+    """
+    Message adapter proxy that only builds the real adapter the first time a repository publishes.
+
+    The real adapters keep their connection and channel on the instance, so one is kept per thread.
+    """
+
+    def __init__(self, adapter_builder: Callable[[], MessageAdapter]):
+        super().__init__()
+        self._adapter_builder = adapter_builder
+        self._local = threading.local()
+
+    @property
+    def adapter(self) -> MessageAdapter:
+        adapter = getattr(self._local, 'adapter', None)
+        if adapter is None:
+            adapter = self._local.adapter = self._adapter_builder()
+        return adapter
+
+    def send_message(self, queue_name: str, message: dict):
+        return self.adapter.send_message(queue_name, message)
+
+    def consume_messages(self, queue_name: str, callback_function: callable = None):
+        return self.adapter.consume_messages(queue_name, callback_function)
+
+    def __enter__(self):
+        return self.adapter.__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.adapter.__exit__(exc_type, exc_value, traceback)
+
+
+class RepositoryRegistry:
+    """
+    Process-wide, thread-safe registry of DB adapters, message adapters and repositories.
+
+    Adapters keep their connection state per thread, so a single instance of each is shared by the
+    whole process. Request specific state such as `person_id` is bound onto a shallow copy of the
+    cached repository.
+    """
+
+    _lock = threading.RLock()
+    _instances = {}
+
+    @classmethod
+    def _get_or_create(cls, key, builder: Callable):
+        instance = cls._instances.get(key)
+        if instance is None:
+            with cls._lock:
+                instance = cls._instances.get(key)
+                if instance is None:
+                    instance = cls._instances[key] = builder()
+        return instance
+
+    @classmethod
+    def get_db_adapter(cls, key, adapter_builder: Callable[[], PostgreSQLAdapter]) -> PostgreSQLAdapter:
+        return cls._get_or_create(('db_adapter', key), adapter_builder)
+
+    @classmethod
+    def get_message_adapter(cls, key, adapter_builder: Callable[[], MessageAdapter]) -> LazyMessageAdapter:
+        return cls._get_or_create(('message_adapter', key), lambda: LazyMessageAdapter(adapter_builder))
+
+    @classmethod
+    def get_repository(cls, key, repository_builder: Callable[[], BaseRepository], person_id=None) -> BaseRepository:
+        repository = cls._get_or_create(('repository', key), repository_builder)
+
+        bound_repository = copy.copy(repository)
+        bound_repository.user_id = person_id
+        return bound_repository
+
+    @classmethod
+    def clear(cls):
+        """Drop every cached adapter and repository."""
+        with cls._lock:
+            cls._instances.clear()
 
 
 class RepositoryFactory:
@@ -76,9 +183,22 @@ class RepositoryFactory:
         RepoType.EMAIL: EmailRepository,
         RepoType.LOGIN_METHOD: LoginMethodRepository,
         RepoType.PERSON_ORGANIZATION_ROLE: PersonOrganizationRoleRepository,
-        RepoType.TODO: TodoRepository
+        RepoType.TODO: TodoRepository,
+        RepoType.OUTBOX: OutboxRepository
     }
 
+    def _get_db_key(self):
+        return (
+            get_flask_pooled_db(), self.config.POSTGRES_HOST, int(self.config.POSTGRES_PORT),
+            self.config.POSTGRES_USER, self.config.POSTGRES_DB
+        )
+
+    def _get_message_adapter_key(self):
+        return (
+            self.config.RABBITMQ_HOST, int(self.config.RABBITMQ_PORT),
+            self.config.RABBITMQ_USER, self.config.RABBITMQ_VIRTUAL_HOST
+        )
+
     def get_db_connection(self):
         host = self.config.POSTGRES_HOST
         port = int(self.config.POSTGRES_PORT)
@@ -86,7 +206,7 @@ class RepositoryFactory:
         password = self.config.POSTGRES_PASSWORD
         database = self.config.POSTGRES_DB
 
-        return PostgreSQLAdapter(host, port, user, password, database, connection_resolver=get_connection_resolver(), connection_closer=get_connection_closer())
+        return ThreadLocalPostgreSQLAdapter(host, port, user, password, database, connection_resolver=get_connection_resolver(), connection_closer=get_connection_closer())
 
     def _get_rabbitmq_connection(self):
         return RabbitMqConnection(
@@ -100,13 +220,29 @@ class RepositoryFactory:
     def get_adapter(self):
         return self._get_rabbitmq_connection()
 
-    def get_repository(self, repo_type: RepoType, person_id=None, message_queue_name: str = ""):
-        adapter = self.get_db_connection()
-        message_adapter = self.get_adapter()
+    def create_repository(self, repo_type: RepoType, person_id=None, message_queue_name: str = ""):
+        """Build a repository with its own fresh adapters, bypassing the registry."""
         repo_class = self._repositories.get(repo_type)
 
         if repo_class:
-            import threading
-            return repo_class(adapter, message_adapter, message_queue_name, person_id)
+            return repo_class(self.get_db_connection(), self.get_adapter(), message_queue_name, person_id)
 
         raise ValueError(f"No repository found with the name '{repo_type}'")
+
+    def get_repository(self, repo_type: RepoType, person_id=None, message_queue_name: str = ""):
+        repo_class = self._repositories.get(repo_type)
+
+        if not repo_class:
+            raise ValueError(f"No repository found with the name '{repo_type}'")
+
+        db_key = self._get_db_key()
+        message_adapter_key = self._get_message_adapter_key()
+
+        def build_repository():
+            adapter = RepositoryRegistry.get_db_adapter(db_key, self.get_db_connection)
+            message_adapter = RepositoryRegistry.get_message_adapter(message_adapter_key, self.get_adapter)
+            return repo_class(adapter, message_adapter, message_queue_name)
+
+        return RepositoryRegistry.get_repository(
+            (repo_type, db_key, message_adapter_key, message_queue_name), build_repository, person_id
+        )
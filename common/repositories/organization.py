@@ -18,3 +18,29 @@ class OrganizationRepository(BaseRepository):
         with self.adapter:
             results = self.adapter.execute_query(query, params)
             return results
+
+    def get_organizations_by_person_id_after(self, person_id: str, after: str = None, limit: int = None):
+        """
+        Keyset pagination of a person's active memberships ordered by organization_id.
+
+        Only the listed columns are selected, so the person_organization_role (person_id, organization_id, role, active)
+        index covers the membership side and each organization is fetched by its primary key.
+        """
+        query = """
+            SELECT por.organization_id AS entity_id, o.name, o.code, por.role
+            FROM person_organization_role AS por
+            JOIN organization AS o
+            ON o.entity_id = por.organization_id
+            WHERE por.person_id = %s AND por.active = true AND o.active = true
+        """
+        params = (person_id,)
+        if after is not None:
+            query += " AND por.organization_id > %s"
+            params += (after,)
+        query += " ORDER BY por.organization_id ASC"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+
+        with self.adapter:
+            results = self.adapter.execute_query(query, params)
+            return results or []
@@ -0,0 +1,68 @@
+from typing import List
+
+from common.repositories.base import BaseRepository
+from common.models.outbox_message import OutboxMessage
+
+
+class OutboxRepository(BaseRepository):
+    """
+    Outbox messages are written once and then only have their delivery columns updated by the relay,
+    so they bypass versioning and have no audit table.
+    """
+    MODEL = OutboxMessage
+
+    def enqueue(self, message: OutboxMessage) -> OutboxMessage:
+        """Insert a message on its own; use UnitOfWork.save to write it with other changes instead."""
+        self._run_transaction([self._get_insert_many_query([self._process_data_before_save(message)])])
+        return message
+
+    def claim_pending(self, limit: int, lease_seconds: int, max_attempts: int) -> List[OutboxMessage]:
+        """
+        Lease up to `limit` unpublished messages, oldest first.
+
+        Rows locked by another relay are skipped, and a leased row only becomes available again once its lease
+        expires, so concurrent relays never publish the same row at the same time.
+        """
+        query = """
+            UPDATE outbox_message
+            SET locked_until = (now() AT TIME ZONE 'utc') + make_interval(secs => %s), attempts = attempts + 1
+            WHERE entity_id IN (
+                SELECT entity_id FROM outbox_message
+                WHERE published_on IS NULL AND active = true AND attempts < %s
+                AND (locked_until IS NULL OR locked_until < (now() AT TIME ZONE 'utc'))
+                ORDER BY changed_on, entity_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+        """
+        rows = self._execute_returning(query, (lease_seconds, max_attempts, limit))
+        rows.sort(key=lambda row: (row['changed_on'], row['entity_id']))
+        return [self.model.from_dict(row) for row in rows]
+
+    def mark_published(self, entity_ids: List[str]):
+        if not entity_ids:
+            return
+        query = """
+            UPDATE outbox_message SET published_on = (now() AT TIME ZONE 'utc'), locked_until = NULL, last_error = NULL
+            WHERE entity_id = ANY(%s)
+        """
+        with self.adapter:
+            self.adapter.execute_query(query, (entity_ids,))
+
+    def mark_failed(self, entity_id: str, error: str, retry_delay: int):
+        """Record a failed publish and keep the row leased for `retry_delay` seconds before it is retried."""
+        query = """
+            UPDATE outbox_message SET last_error = %s, locked_until = (now() AT TIME ZONE 'utc') + make_interval(secs => %s)
+            WHERE entity_id = %s
+        """
+        with self.adapter:
+            self.adapter.execute_query(query, (error, retry_delay, entity_id))
+
+    def delete_published(self, older_than_days: int) -> int:
+        query = """
+            DELETE FROM outbox_message
+            WHERE published_on < (now() AT TIME ZONE 'utc') - make_interval(days => %s)
+            RETURNING entity_id
+        """
+        return len(self._execute_returning(query, (older_than_days,)))
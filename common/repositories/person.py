@@ -4,3 +4,4 @@ from common.models.person import Person
 
 class PersonRepository(BaseRepository):
     MODEL = Person
+    USE_ENTITY_CACHE = True
@@ -4,3 +4,18 @@ from common.models.person_organization_role import PersonOrganizationRole
 
 class PersonOrganizationRoleRepository(BaseRepository):
     MODEL = PersonOrganizationRole
+
+    def get_memberships_by_person_id(self, person_id: str):
+        """Get every active membership of a person with its organization row, in a single JOIN query"""
+        query = """
+            SELECT row_to_json(o) AS organization, row_to_json(por) AS role
+            FROM person_organization_role AS por
+            JOIN organization AS o
+            ON o.entity_id = por.organization_id
+            WHERE por.person_id = %s AND por.active = true AND o.active = true;
+        """
+        params = (person_id,)
+
+        with self.adapter:
+            results = self.adapter.execute_query(query, params)
+            return results
@@ -4,23 +4,62 @@ from common.models.todo import Todo
 
 class TodoRepository(BaseRepository):
     MODEL = Todo
+
+    # Matches the todo_person_id_changed_on_entity_id_ind index, so pages are stable and seekable.
+    PAGE_ORDER = ["changed_on", "entity_id"]
+
+    # Must match the expression of the todo_search_ind GIN index for the index to be used.
+    SEARCH_VECTOR = "to_tsvector('english', coalesce(todo.title, '') || ' ' || coalesce(todo.description, ''))"
     
     def get_todos_by_person_id(self, person_id: str, offset: int = 0, limit: int = None):
         """Get all todos for a specific person with pagination"""
-        return self.get_many({"person_id": person_id}, offset=offset, limit=limit)
+        return self.get_many({"person_id": person_id}, sort=self._page_sort(), offset=offset, limit=limit)
     
     def get_completed_todos_by_person_id(self, person_id: str, offset: int = 0, limit: int = None):
         """Get completed todos for a specific person with pagination"""
-        return self.get_many({"person_id": person_id, "is_completed": True}, offset=offset, limit=limit)
+        return self.get_many({"person_id": person_id, "is_completed": True}, sort=self._page_sort(), offset=offset, limit=limit)
     
     def get_incomplete_todos_by_person_id(self, person_id: str, offset: int = 0, limit: int = None):
         """Get incomplete todos for a specific person with pagination"""
-        return self.get_many({"person_id": person_id, "is_completed": False}, offset=offset, limit=limit)
+        return self.get_many({"person_id": person_id, "is_completed": False}, sort=self._page_sort(), offset=offset, limit=limit)
     
-    def count(self, filter_dict):
-        """Count records matching the given filter"""
-        results = self.get_many(filter_dict)
-        return len(results)
+    def get_todos_by_person_id_after(self, person_id: str, after: tuple = None, limit: int = None, is_completed: bool = None):
+        """Get todos for a specific person that come after the (changed_on, entity_id) keyset"""
+        conditions = {"person_id": person_id}
+        if is_completed is not None:
+            conditions["is_completed"] = is_completed
+        return self.get_many_after(self.PAGE_ORDER, after=after, conditions=conditions, limit=limit)
+
+    def iter_todos_by_person_id(self, person_id: str, fetch_size: int = 1000):
+        """Iterate over all todos of a specific person in page order, fetching `fetch_size` rows at a time"""
+        return self.iter_many({"person_id": person_id}, order_by=self.PAGE_ORDER, fetch_size=fetch_size)
+
+    def search_todos_by_person_id(self, person_id: str, query: str, offset: int = 0, limit: int = None):
+        """
+        Full-text search over the title and description of a person's todos, best matches first.
+
+        `query` takes web search syntax: quoted phrases, `or` and `-` for exclusion.
+        """
+        sql = (
+            f"SELECT todo.*, ts_rank({self.SEARCH_VECTOR}, search_query) AS rank "
+            f"FROM todo, websearch_to_tsquery('english', %s) AS search_query "
+            f"WHERE todo.person_id = %s AND todo.active = true AND {self.SEARCH_VECTOR} @@ search_query "
+            f"ORDER BY rank DESC, todo.changed_on DESC, todo.entity_id"
+        )
+        params = (query, person_id)
+        if limit is not None:
+            sql += " LIMIT %s"
+            params += (int(limit),)
+        if offset:
+            sql += " OFFSET %s"
+            params += (int(offset),)
+
+        with self.adapter:
+            records = self.adapter.execute_query(sql, params)
+        return [self.model.from_dict(record) for record in records or []]
+
+    def _page_sort(self):
+        return [(column, "ASC") for column in self.PAGE_ORDER]
     
     def count_todos_by_person_id(self, person_id: str):
         """Count all todos for a specific person"""
@@ -32,4 +71,64 @@ class TodoRepository(BaseRepository):
     
     def count_incomplete_todos_by_person_id(self, person_id: str):
         """Count incomplete todos for a specific person"""
-        return self.count({"person_id": person_id, "is_completed": False}) 
\ No newline at end of file
+        return self.count({"person_id": person_id, "is_completed": False})
+
+    def get_stats_change_query(self, person_id: str, todos: list) -> tuple:
+        """
+        The statement that applies the saves of `todos` of one person to todo_stats, for a unit of work.
+
+        It must run before the saves in the same transaction: the counter change is the new state of the todos
+        minus the state of their rows, which are locked so concurrent writes to a todo are counted in turn.
+        """
+        total = sum(1 for todo in todos if todo.active)
+        completed = sum(1 for todo in todos if todo.active and todo.is_completed)
+        query = (
+            "INSERT INTO todo_stats AS stats (person_id, total_count, completed_count, changed_on) "
+            "SELECT %s, %s - COUNT(*) FILTER (WHERE previous.active), "
+            "%s - COUNT(*) FILTER (WHERE previous.active AND previous.is_completed), now() "
+            "FROM (SELECT active, is_completed FROM todo WHERE entity_id = ANY(%s) FOR UPDATE) AS previous "
+            "ON CONFLICT (person_id) DO UPDATE SET "
+            "total_count = stats.total_count + EXCLUDED.total_count, "
+            "completed_count = stats.completed_count + EXCLUDED.completed_count, "
+            "changed_on = EXCLUDED.changed_on"
+        )
+        return query, (person_id, total, completed, [todo.entity_id for todo in todos])
+
+    def get_stats_by_person_id(self, person_id: str):
+        """Read the maintained total and completed counts of a person; a person without todos has no row"""
+        with self.adapter:
+            results = self.adapter.execute_query(
+                "SELECT total_count, completed_count FROM todo_stats WHERE person_id = %s", (person_id,)
+            )
+        row = results[0] if results else {}
+        return row.get('total_count', 0), row.get('completed_count', 0)
+
+    def recompute_stats(self, person_id: str = None):
+        """
+        Recount todo_stats from the todo table, for one person or everybody. Returns the person ids whose row was corrected or missing.
+
+        Todo writes of the affected people wait while it runs, so no change is lost between the count and the write.
+        """
+        where_clause, params = ("WHERE person_id = %s ", (person_id,)) if person_id else ("", ())
+        query = (
+            "LOCK TABLE todo_stats IN SHARE ROW EXCLUSIVE MODE;\n"
+            "INSERT INTO todo_stats AS stats (person_id, total_count, completed_count, changed_on) "
+            "SELECT person_id, COUNT(*) FILTER (WHERE active), COUNT(*) FILTER (WHERE active AND is_completed), now() "
+            f"FROM todo {where_clause}GROUP BY person_id "
+            "ON CONFLICT (person_id) DO UPDATE SET "
+            "total_count = EXCLUDED.total_count, completed_count = EXCLUDED.completed_count, changed_on = EXCLUDED.changed_on "
+            "WHERE stats.total_count <> EXCLUDED.total_count OR stats.completed_count <> EXCLUDED.completed_count "
+            "RETURNING person_id"
+        )
+        return [row['person_id'] for row in self._execute_returning(query, params)]
+
+    def count_todos_summary_by_person_id(self, person_id: str):
+        """Count all, completed and incomplete todos for a specific person in a single query"""
+        return self.count_filtered(
+            {
+                "total": {},
+                "completed": {"is_completed": True},
+                "incomplete": {"is_completed": False},
+            },
+            {"person_id": person_id}
+        )
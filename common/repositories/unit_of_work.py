@@ -0,0 +1,106 @@
+from typing import Any, Dict, List
+
+from rococo.models.versioned_model import get_uuid_hex
+
+from common.repositories.audit import group_round_trips
+from common.repositories.base import BaseRepository
+
+
+class UnitOfWork:
+    """
+    Collects saves for several repositories and writes them in a single transaction.
+
+    All repositories must share the same DB adapter (as they do when built by `RepositoryFactory`).
+    Every table costs one multi-row statement, the statements are sent to the DB in one round trip
+    and committed once. Used as a context manager it flushes on exit, unless an exception was raised.
+    """
+
+    def __init__(self):
+        self._operations = []
+        self._statements = []
+        self._commit_callbacks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._operations = []
+            self._statements = []
+            self._commit_callbacks = []
+
+    def on_commit(self, callback):
+        """Call `callback` once the queued saves are committed, e.g. to publish a message about them."""
+        self._commit_callbacks.append(callback)
+
+    def _check_adapter(self, repository: BaseRepository):
+        queued = self._operations or self._statements
+        if queued and queued[0][0].adapter is not repository.adapter:
+            raise ValueError("All repositories in a unit of work must share the same DB adapter.")
+
+    def execute(self, repository: BaseRepository, query: str, values: tuple = ()):
+        """
+        Queue a statement of `repository`, such as a counter update that goes with the saves.
+
+        Statements run in the same transaction, in the order they were queued, before all saves, so they
+        see the rows as they were.
+        """
+        self._check_adapter(repository)
+        self._statements.append((repository, query, tuple(values)))
+
+    def save(self, repository: BaseRepository, instance: Any):
+        """
+        Queue a save of `instance`.
+
+        Instances that were never saved are written with a plain INSERT; existing ones are upserted
+        and audited like `BaseRepository.save` does.
+        """
+        self._check_adapter(repository)
+
+        is_new = instance.previous_version is None and instance.version == get_uuid_hex(0)
+        # Validates the instance now, so nothing is written when any instance is invalid.
+        data = repository._process_data_before_save(instance)
+        self._operations.append((repository, data, is_new))
+        return instance
+
+    def _get_queries(self) -> List[tuple]:
+        queries = [(query, values) for _, query, values in self._statements]
+
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        repositories = {}
+        for repository, data, is_new in self._operations:
+            key = (repository.table_name, is_new)
+            repositories.setdefault(key, repository)
+            groups.setdefault(key, []).append(data)
+
+        for key, data_list in groups.items():
+            repository = repositories[key]
+            _, is_new = key
+            if is_new:
+                queries.append(repository._get_insert_many_query(data_list))
+            else:
+                queries += repository._get_save_many_queries(data_list)
+        return queries
+
+    def flush(self):
+        """Write every queued save in one transaction, then run the commit callbacks."""
+        callbacks, self._commit_callbacks = self._commit_callbacks, []
+        if self._operations or self._statements:
+            self._write()
+        for callback in callbacks:
+            callback()
+
+    def _write(self):
+        queries = self._get_queries()
+        operations, self._operations = self._operations, []
+        statements, self._statements = self._statements, []
+        repository = (operations or statements)[0][0]
+
+        # Send the statements in as few round trips as possible; psycopg2 interpolates the params client side.
+        try:
+            repository._run_transaction(group_round_trips(queries))
+        finally:
+            for operation_repository, data, _ in operations:
+                operation_repository._invalidate_entity_cache(data['entity_id'])
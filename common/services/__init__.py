@@ -3,5 +3,6 @@ from .email import EmailService
 from .login_method import LoginMethodService
 from .organization import OrganizationService
 from .person_organization_role import PersonOrganizationRoleService
+from .outbox import OutboxService
 from .auth import AuthService
 from .todo import TodoService
\ No newline at end of file
@@ -1,14 +1,17 @@
 from common.services import (
     PersonService, EmailService, LoginMethodService, OrganizationService,
-    PersonOrganizationRoleService
+    PersonOrganizationRoleService, OutboxService
 )
 from common.models import Person, Email, LoginMethod, Organization, PersonOrganizationRole
 from common.models.login_method import LoginMethodType
+from common.repositories.unit_of_work import UnitOfWork
 from common.tasks.send_message import MessageSender
 from common.app_logger import logger
+from common.utils.cache import LRUCache
+from common.utils.password_hasher import password_hasher
 
-from werkzeug.security import check_password_hash
-
+from datetime import datetime
+import hashlib
 import jwt
 import time
 
@@ -28,8 +31,14 @@ class AuthService:
         self.login_method_service = LoginMethodService(config)
         self.organization_service = OrganizationService(config)
         self.person_organization_role_service = PersonOrganizationRoleService(config)
+        self.outbox_service = OutboxService(config)
 
         self.message_sender = MessageSender()
+
+        # Decoded claims of verified access tokens, keyed by token digest and kept until the token expires.
+        self.access_token_cache = None
+        if config.ACCESS_TOKEN_CACHE_MAXSIZE > 0:
+            self.access_token_cache = LRUCache(maxsize=config.ACCESS_TOKEN_CACHE_MAXSIZE)
         
 
     def signup(self, email, first_name, last_name):
@@ -59,14 +68,24 @@ class AuthService:
             role="admin"
         )
 
-        email = self.email_service.save_email(email)
-        person = self.person_service.save_person(person)
-        login_method = self.login_method_service.save_login_method(login_method)
-        organization = self.organization_service.save_organization(organization)
-        person_organization_role = self.person_organization_role_service.save_person_organization_role(person_organization_role)
+        # Create the whole account in one transaction so a failure never leaves it half created.
+        with UnitOfWork() as unit_of_work:
+            email = self.email_service.save_email(email, unit_of_work=unit_of_work)
+            person = self.person_service.save_person(person, unit_of_work=unit_of_work)
+            login_method = self.login_method_service.save_login_method(login_method, unit_of_work=unit_of_work)
+            organization = self.organization_service.save_organization(organization, unit_of_work=unit_of_work)
+            person_organization_role = self.person_organization_role_service.save_person_organization_role(
+                person_organization_role, unit_of_work=unit_of_work
+            )
+            self.send_verification_email(login_method, person, email.email, unit_of_work=unit_of_work)
 
-        self.send_verification_email(login_method, person, email.email)
 
+    def rehash_password(self, login_method: LoginMethod, password: str):
+        """Re-hash a verified password with the configured parameters. Failures only cost the upgrade, not the login."""
+        try:
+            self.login_method_service.update_password(login_method, password_hasher.hash(password))
+        except Exception as e:
+            logger.warning(f"Could not rehash the password of login method {login_method.entity_id}: {e}")
 
     def generate_reset_password_token(self, login_method: LoginMethod, email: str):
         person_id, email_id = login_method.person_id, login_method.email_id
@@ -90,7 +109,20 @@ class AuthService:
         return password_reset_url
 
 
-    def send_verification_email(self, login_method: LoginMethod, person: Person, email: str):
+    def send_email_message(self, message: dict, unit_of_work: UnitOfWork = None):
+        """
+        Queue an email event in the outbox, within `unit_of_work` when given.
+
+        With the outbox disabled the event is published directly, after `unit_of_work` commits.
+        """
+        if self.config.EMAIL_OUTBOX_ENABLED:
+            self.outbox_service.enqueue_message(self.EMAIL_TRANSMITTER_QUEUE_NAME, message, unit_of_work=unit_of_work)
+        elif unit_of_work is not None:
+            unit_of_work.on_commit(lambda: self.message_sender.send_message(self.EMAIL_TRANSMITTER_QUEUE_NAME, message))
+        else:
+            self.message_sender.send_message(self.EMAIL_TRANSMITTER_QUEUE_NAME, message)
+
+    def send_verification_email(self, login_method: LoginMethod, person: Person, email: str, unit_of_work: UnitOfWork = None):
         try:
             if verify_link := self.prepare_password_reset_url(login_method, email):
                 message = {
@@ -103,8 +135,8 @@ class AuthService:
                 }
                 logger.info(f"Sending verification email to {email}")
                 logger.debug(f"Verification link: {verify_link}")
-                self.message_sender.send_message(self.EMAIL_TRANSMITTER_QUEUE_NAME, message)
-                logger.info(f"Verification email sent successfully to {email}")
+                self.send_email_message(message, unit_of_work=unit_of_work)
+                logger.info(f"Verification email queued successfully for {email}")
             else:
                 logger.error(f"Failed to generate verification link for {email}")
                 raise APIException("Failed to generate verification link")
@@ -119,27 +151,81 @@ class AuthService:
         
         login_method = self.login_method_service.get_login_method_by_email_id(email_obj.entity_id)
 
-        if not check_password_hash(login_method.password, password):
+        if not password_hasher.verify(login_method.password, password):
             raise InputValidationError('Incorrect email or password.')
-        
-        access_token, expiry = self.generate_access_token(login_method)
+
+        if password_hasher.needs_rehash(login_method.password):
+            self.rehash_password(login_method, password)
+
+        person = None
+        if self.config.ACCESS_TOKEN_SNAPSHOT:
+            person = self.person_service.get_person_by_id(email_obj.person_id)
+
+        access_token, expiry = self.generate_access_token(login_method, person=person, email=email_obj)
 
         return access_token, expiry
 
-    def generate_access_token(self, login_method: LoginMethod) -> str:
+    def generate_access_token(self, login_method: LoginMethod, person: Person = None, email: Email = None) -> str:
+        return self._encode_access_token(login_method.person_id, login_method.email_id, person, email)
+
+    def refresh_access_token(self, person: Person, email: Email):
+        """Issue a new access token for a signed in person, e.g. so the token snapshot picks up a change."""
+        return self._encode_access_token(person.entity_id, email.entity_id, person, email)
+
+    def _encode_access_token(self, person_id: str, email_id: str, person: Person = None, email: Email = None):
         expiry = time.time() + int(self.config.ACCESS_TOKEN_EXPIRE)
+        payload = {
+            'email_id': email_id,
+            'person_id': person_id,
+            'exp': expiry,
+        }
+        # Signed snapshots let login_required rebuild the person and email without querying the DB.
+        if self.config.ACCESS_TOKEN_SNAPSHOT and person is not None and email is not None:
+            payload['person'] = person.as_dict(convert_datetime_to_iso_string=True)
+            payload['email'] = email.as_dict(convert_datetime_to_iso_string=True)
+
         token = jwt.encode(
-            {
-                'email_id': login_method.email_id,
-                'person_id': login_method.person_id,
-                'exp': expiry,
-            },
+            payload,
             self.config.AUTH_JWT_SECRET,
             algorithm='HS256'
         )
         return token, expiry
 
+    @staticmethod
+    def _model_from_snapshot(model_class, snapshot: dict):
+        """Rebuild a model from a token snapshot, or return None if the snapshot does not cover all its fields."""
+        if not isinstance(snapshot, dict) or not set(model_class.fields()).issubset(snapshot):
+            return None
+        data = dict(snapshot)
+        if isinstance(data.get('changed_on'), str):
+            data['changed_on'] = datetime.fromisoformat(data['changed_on'])
+        return model_class.from_dict(data)
+
+    def get_person_and_email_from_token(self, parsed_token: dict):
+        """
+        Return the person and email an access token was issued for.
+
+        Both come from the token snapshot when it carries every model field, so no query is made;
+        otherwise, e.g. for tokens issued without snapshots, they are loaded by id.
+        """
+        person = self._model_from_snapshot(Person, parsed_token.get('person'))
+        if person is None:
+            person = self.person_service.get_person_by_id(parsed_token.get('person_id'))
+
+        email = self._model_from_snapshot(Email, parsed_token.get('email'))
+        if email is None:
+            email = self.email_service.get_email_by_id(parsed_token.get('email_id'))
+
+        return person, email
+
     def parse_access_token(self, access_token: str) -> dict:
+        cache_key = None
+        if self.access_token_cache is not None:
+            cache_key = hashlib.sha256(access_token.encode()).digest()
+            cached_token = self.access_token_cache.get(cache_key)
+            if cached_token is not None:
+                return dict(cached_token)
+
         try:
             decoded_token = jwt.decode(
                 access_token,
@@ -148,6 +234,8 @@ class AuthService:
             )
             exp_time = decoded_token['exp']
             if time.time() <= exp_time:
+                if cache_key is not None:
+                    self.access_token_cache.set(cache_key, dict(decoded_token), ttl=exp_time - time.time())
                 return decoded_token
         except jwt.ExpiredSignatureError:
             return
@@ -186,16 +274,10 @@ class AuthService:
                     "verify_link": password_reset_url                },
                 "to_emails": [email],
             }
-            self.message_sender.send_message(self.EMAIL_TRANSMITTER_QUEUE_NAME, message)
+            self.send_email_message(message)
 
 
     def reset_user_password(self, token: str, uidb64: str, password: str):
-        # Create new login method temporarily to validate and generate hashed password in its `password` field.`
-        new_login_method = LoginMethod(
-            method_type=LoginMethodType.EMAIL_PASSWORD,
-            raw_password=password
-        )
-
         login_method_id = force_str(urlsafe_base64_decode(uidb64))
         login_method = self.login_method_service.get_login_method_by_id(login_method_id)
 
@@ -214,10 +296,16 @@ class AuthService:
         person_obj = self.person_service.get_person_by_id(parsed_token['person_id'])
         if not person_obj:
             raise APIException("Person with email not found.")
-        
-        
+
+        # Create new login method temporarily to validate and generate hashed password in its `password` field.
+        # This is done after the token checks so invalid reset links never cost a password hash.
+        new_login_method = LoginMethod(
+            method_type=LoginMethodType.EMAIL_PASSWORD,
+            raw_password=password
+        )
+
         login_method = self.login_method_service.update_password(login_method, new_login_method.password)
         email_obj = self.email_service.verify_email(email_obj)
 
-        access_token, expiry = self.generate_access_token(login_method)
+        access_token, expiry = self.generate_access_token(login_method, person=person_obj, email=email_obj)
         return access_token, expiry, person_obj
\ No newline at end of file
@@ -1,4 +1,5 @@
 from common.repositories.factory import RepositoryFactory, RepoType
+from common.repositories.unit_of_work import UnitOfWork
 from common.models import Email
 
 
@@ -9,7 +10,9 @@ class EmailService:
         self.repository_factory = RepositoryFactory(config)
         self.email_repo = self.repository_factory.get_repository(RepoType.EMAIL)
 
-    def save_email(self, email: Email):
+    def save_email(self, email: Email, unit_of_work: UnitOfWork = None):
+        if unit_of_work is not None:
+            return unit_of_work.save(self.email_repo, email)
         email = self.email_repo.save(email)
         return email
 
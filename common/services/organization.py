@@ -1,6 +1,13 @@
 from common.repositories.factory import RepositoryFactory, RepoType
+from common.repositories.unit_of_work import UnitOfWork
+from common.services.person_organization_role import PersonOrganizationRoleService
 from common.models import Organization
 
+import json
+
+from app.helpers.string_utils import urlsafe_base64_encode, urlsafe_base64_decode, force_bytes, force_str
+from app.helpers.exceptions import InputValidationError
+
 
 class OrganizationService:
 
@@ -9,9 +16,15 @@ class OrganizationService:
         self.repository_factory = RepositoryFactory(config)
         self.organization_repo = self.repository_factory.get_repository(RepoType.ORGANIZATION)
 
-    def save_organization(self, organization: Organization):
-        organization = self.organization_repo.save(organization)
-        return organization
+    def save_organization(self, organization: Organization, unit_of_work: UnitOfWork = None):
+        # Membership indexes hold organization rows of every member, and there is no reverse index to find them.
+        if unit_of_work is not None:
+            unit_of_work.on_commit(PersonOrganizationRoleService.invalidate_memberships)
+            return unit_of_work.save(self.organization_repo, organization)
+        try:
+            return self.organization_repo.save(organization)
+        finally:
+            PersonOrganizationRoleService.invalidate_memberships()
 
     def get_organization_by_id(self, entity_id: str):
         organization = self.organization_repo.get_one({"entity_id": entity_id})
@@ -20,3 +33,33 @@ class OrganizationService:
     def get_organizations_with_roles_by_person(self, person_id: str):
         results = self.organization_repo.get_organizations_by_person_id(person_id)
         return results
+
+    def get_organizations_page_by_person(self, person_id: str, cursor: str = None, per_page: int = 100):
+        """
+        Get a page of a person's organizations with their roles using keyset pagination.
+
+        Returns the organizations and the opaque cursor of the next page, which is None on the last page.
+        """
+        after = self.decode_page_cursor(cursor) if cursor else None
+        # Fetch one extra row to know whether there is a next page without counting.
+        organizations = self.organization_repo.get_organizations_by_person_id_after(
+            person_id, after=after, limit=per_page + 1
+        )
+
+        next_cursor = None
+        if len(organizations) > per_page:
+            organizations = organizations[:per_page]
+            next_cursor = self.encode_page_cursor(organizations[-1]['entity_id'])
+        return organizations, next_cursor
+
+    @staticmethod
+    def encode_page_cursor(organization_id: str) -> str:
+        return urlsafe_base64_encode(force_bytes(json.dumps([organization_id])))
+
+    @staticmethod
+    def decode_page_cursor(cursor: str) -> str:
+        try:
+            organization_id, = json.loads(force_str(urlsafe_base64_decode(cursor)))
+            return str(organization_id)
+        except (ValueError, TypeError):
+            raise InputValidationError("Invalid pagination cursor.")
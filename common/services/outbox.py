@@ -0,0 +1,18 @@
+from common.repositories.factory import RepositoryFactory, RepoType
+from common.repositories.unit_of_work import UnitOfWork
+from common.models import OutboxMessage
+
+
+class OutboxService:
+
+    def __init__(self, config):
+        self.config = config
+        self.repository_factory = RepositoryFactory(config)
+        self.outbox_repo = self.repository_factory.get_repository(RepoType.OUTBOX)
+
+    def enqueue_message(self, queue_name: str, payload: dict, exchange_name: str = None, unit_of_work: UnitOfWork = None):
+        """Write a message to the outbox; with a unit of work it is committed together with the other saves."""
+        message = OutboxMessage(queue_name=queue_name, exchange_name=exchange_name, payload=payload)
+        if unit_of_work is not None:
+            return unit_of_work.save(self.outbox_repo, message)
+        return self.outbox_repo.enqueue(message)
@@ -1,4 +1,5 @@
 from common.repositories.factory import RepositoryFactory, RepoType
+from common.repositories.unit_of_work import UnitOfWork
 from common.models.person import Person
 
 
@@ -13,7 +14,9 @@ class PersonService:
         self.repository_factory = RepositoryFactory(config)
         self.person_repo = self.repository_factory.get_repository(RepoType.PERSON)
 
-    def save_person(self, person: Person):
+    def save_person(self, person: Person, unit_of_work: UnitOfWork = None):
+        if unit_of_work is not None:
+            return unit_of_work.save(self.person_repo, person)
         person = self.person_repo.save(person)
         return person
 
@@ -1,17 +1,37 @@
 from common.repositories.factory import RepositoryFactory, RepoType
-from common.models import PersonOrganizationRole
+from common.repositories.unit_of_work import UnitOfWork
+from common.models import Organization, PersonOrganizationRole
+from common.utils.cache import LRUCache
+
+from datetime import datetime
+import threading
 
 
 class PersonOrganizationRoleService:
+    # Per-person membership index: organization_id -> (organization row, role row), shared by all instances.
+    _membership_cache = None
+    _membership_cache_lock = threading.Lock()
 
     def __init__(self, config):
         self.config = config
         self.repository_factory = RepositoryFactory(config)
         self.person_organization_role_repo = self.repository_factory.get_repository(RepoType.PERSON_ORGANIZATION_ROLE)
 
-    def save_person_organization_role(self, person_organization_role: PersonOrganizationRole):
-        person_organization_role = self.person_organization_role_repo.save(person_organization_role)
-        return person_organization_role
+        with self._membership_cache_lock:
+            if PersonOrganizationRoleService._membership_cache is None:
+                PersonOrganizationRoleService._membership_cache = LRUCache(
+                    maxsize=config.MEMBERSHIP_CACHE_MAXSIZE, ttl=config.MEMBERSHIP_CACHE_TTL
+                )
+
+    def save_person_organization_role(self, person_organization_role: PersonOrganizationRole, unit_of_work: UnitOfWork = None):
+        if unit_of_work is not None:
+            # Invalidated once committed, so a concurrent load cannot cache the rows the commit replaces.
+            unit_of_work.on_commit(lambda: self.invalidate_memberships(person_organization_role.person_id))
+            return unit_of_work.save(self.person_organization_role_repo, person_organization_role)
+        try:
+            return self.person_organization_role_repo.save(person_organization_role)
+        finally:
+            self.invalidate_memberships(person_organization_role.person_id)
 
     def get_roles_by_person_id(self, person_id: str):
         person_organization_roles = self.person_organization_role_repo.get_many({"person_id": person_id})
@@ -21,4 +41,43 @@ class PersonOrganizationRoleService:
             "person_id": person_id,
             "organization_id": organization_id
         })
-        return person_organization_role
\ No newline at end of file
+        return person_organization_role
+
+    def get_memberships_by_person_id(self, person_id: str) -> dict:
+        """Get the cached membership index of a person, loading it with one query on a miss"""
+        cache = self._membership_cache
+        memberships = cache.get(person_id)
+        if memberships is None:
+            generation = cache.generation
+            memberships = {
+                row['organization']['entity_id']: (row['organization'], row['role'])
+                for row in self.person_organization_role_repo.get_memberships_by_person_id(person_id)
+            }
+            cache.set(person_id, memberships, generation=generation)
+        return memberships
+
+    def get_membership(self, person_id: str, organization_id: str):
+        """Return the organization and the person's role in it, or (None, None) if the person is not a member"""
+        membership = self.get_memberships_by_person_id(person_id).get(organization_id)
+        if membership is None:
+            return None, None
+
+        organization_data, role_data = membership
+        return self._model_from_row(Organization, organization_data), self._model_from_row(PersonOrganizationRole, role_data)
+
+    @staticmethod
+    def _model_from_row(model_class, data: dict):
+        data = dict(data)
+        if isinstance(data.get('changed_on'), str):
+            data['changed_on'] = datetime.fromisoformat(data['changed_on'])
+        return model_class.from_dict(data)
+
+    @classmethod
+    def invalidate_memberships(cls, person_id: str = None):
+        """Drop the membership index of a person, or of everyone when no person is given"""
+        if cls._membership_cache is None:
+            return
+        if person_id is None:
+            cls._membership_cache.clear()
+        else:
+            cls._membership_cache.delete(person_id)
@@ -1,6 +1,15 @@
 from common.repositories.factory import RepositoryFactory, RepoType
+from common.repositories.unit_of_work import UnitOfWork
 from common.models.todo import Todo
 
+from datetime import datetime
+import copy
+import json
+
+from app.helpers.string_utils import urlsafe_base64_encode, urlsafe_base64_decode, force_bytes, force_str
+from app.helpers.exceptions import InputValidationError
+from rococo.models.versioned_model import ModelValidationError
+
 
 class TodoService:
     def __init__(self, config):
@@ -19,7 +28,20 @@ class TodoService:
     
     def save_todo_object(self, todo: Todo):
         """Save an existing Todo object"""
-        return self.todo_repo.save(todo)
+        self._save_todos([todo])
+        return todo
+
+    def _save_todos(self, todos: list):
+        """Save todos and apply them to the todo_stats counters of their people in one transaction"""
+        todos_by_person = {}
+        for todo in todos:
+            todos_by_person.setdefault(todo.person_id, []).append(todo)
+
+        with UnitOfWork() as unit_of_work:
+            for person_id, person_todos in todos_by_person.items():
+                unit_of_work.execute(self.todo_repo, *self.todo_repo.get_stats_change_query(person_id, person_todos))
+            for todo in todos:
+                unit_of_work.save(self.todo_repo, todo)
     
     def get_todo_by_id(self, entity_id: str):
         """Get a todo by its ID"""
@@ -40,6 +62,52 @@ class TodoService:
         offset = (page - 1) * per_page if page > 0 else 0
         return self.todo_repo.get_incomplete_todos_by_person_id(person_id, offset=offset, limit=per_page)
     
+    def iter_todos_by_person_id(self, person_id: str):
+        """Iterate over all todos of a person without loading them all at once"""
+        return self.todo_repo.iter_todos_by_person_id(person_id, fetch_size=self.config.TODO_EXPORT_FETCH_SIZE)
+
+    def search_todos_by_person_id(self, person_id: str, query: str, page: int = 1, per_page: int = 10):
+        """
+        Search a person's todos, ranked by relevance, with pagination.
+
+        Returns the todos of the page and whether there is a next page.
+        """
+        offset = (page - 1) * per_page if page > 0 else 0
+        # Fetch one extra row to know whether there is a next page without counting every match.
+        todos = self.todo_repo.search_todos_by_person_id(person_id, query, offset=offset, limit=per_page + 1)
+        return todos[:per_page], len(todos) > per_page
+
+    def get_todos_page_by_person_id(self, person_id: str, cursor: str = None, per_page: int = 10, is_completed: bool = None):
+        """
+        Get a page of todos for a person using keyset pagination.
+
+        Returns the todos and the opaque cursor of the next page, which is None on the last page.
+        """
+        after = self.decode_page_cursor(cursor) if cursor else None
+        # Fetch one extra row to know whether there is a next page without counting.
+        todos = self.todo_repo.get_todos_by_person_id_after(
+            person_id, after=after, limit=per_page + 1, is_completed=is_completed
+        )
+
+        next_cursor = None
+        if len(todos) > per_page:
+            todos = todos[:per_page]
+            next_cursor = self.encode_page_cursor(todos[-1])
+        return todos, next_cursor
+
+    @staticmethod
+    def encode_page_cursor(todo: Todo) -> str:
+        key = [todo.changed_on.isoformat(), todo.entity_id]
+        return urlsafe_base64_encode(force_bytes(json.dumps(key)))
+
+    @staticmethod
+    def decode_page_cursor(cursor: str) -> tuple:
+        try:
+            changed_on, entity_id = json.loads(force_str(urlsafe_base64_decode(cursor)))
+            return datetime.fromisoformat(changed_on), str(entity_id)
+        except (ValueError, TypeError):
+            raise InputValidationError("Invalid pagination cursor.")
+    
     def count_todos_by_person_id(self, person_id: str):
         """Count all todos for a person"""
         return self.todo_repo.count_todos_by_person_id(person_id)
@@ -52,11 +120,103 @@ class TodoService:
         """Count incomplete todos for a person"""
         return self.todo_repo.count_incomplete_todos_by_person_id(person_id)
     
+    def get_todo_counts_by_person_id(self, person_id: str):
+        """Get total, completed and incomplete todo counts for a person from the maintained todo_stats row"""
+        total, completed = self.todo_repo.get_stats_by_person_id(person_id)
+        return {"total": total, "completed": completed, "incomplete": total - completed}
+
+    def recompute_todo_stats(self, person_id: str = None):
+        """Recount the todo_stats counters of a person, or of everybody; returns the person ids that were corrected"""
+        return self.todo_repo.recompute_stats(person_id)
+    
     def delete_todo(self, entity_id: str):
         """Delete a todo by its ID"""
 
         todo = self.get_todo_by_id(entity_id) 
 
         if todo:
-            return self.todo_repo.delete(todo)
-        return False 
\ No newline at end of file
+            todo.active = False
+            self._save_todos([todo])
+            return todo
+        return False
+
+    def apply_bulk_operations(self, person_id: str, operations: list):
+        """
+        Create, update and delete many todos of a person with batched writes in one transaction.
+
+        Each operation is a dict with `op` ("create", "update" or "delete"), the `entity_id` for
+        updates and deletes, and `title`, `description` and `is_completed` as needed.
+        Returns one result per operation, in order, with its `status` and the todo or an error `message`.
+        """
+        entity_ids = [
+            operation.get("entity_id") for operation in operations
+            if isinstance(operation, dict) and operation.get("op") in ("update", "delete")
+        ]
+        existing_todos = {}
+        if entity_ids:
+            existing_todos = {
+                todo.entity_id: todo
+                for todo in self.todo_repo.get_many({"entity_id": entity_ids, "person_id": person_id})
+            }
+
+        results, to_save, seen_ids = [], [], set()
+        for index, operation in enumerate(operations):
+            op = operation.get("op") if isinstance(operation, dict) else None
+            result = {"index": index, "op": op}
+            results.append(result)
+            try:
+                if op in ("update", "delete") and operation.get("entity_id") in seen_ids:
+                    raise InputValidationError("Todo is changed more than once in this request.")
+                todo = self._prepare_bulk_operation(person_id, op, operation, existing_todos)
+                # prepare_for_save fills the version fields that validation checks, so dry-run it on a copy
+                copy.copy(todo).prepare_for_save(changed_by_id=None)
+            except (InputValidationError, ModelValidationError) as e:
+                result.update(status="error", message=str(e))
+                continue
+
+            seen_ids.add(todo.entity_id)
+            result["todo"] = todo
+            to_save.append(todo)
+
+        if to_save:
+            self._save_todos(to_save)
+
+        statuses = {"create": "created", "update": "updated", "delete": "deleted"}
+        for result in results:
+            if "todo" in result:
+                result["status"] = statuses[result["op"]]
+        return results
+
+    @staticmethod
+    def _prepare_bulk_operation(person_id: str, op: str, operation: dict, existing_todos: dict) -> Todo:
+        if op == "create":
+            if not operation.get("title") or not str(operation["title"]).strip():
+                raise InputValidationError("'title' is required and cannot be empty.")
+            return Todo(
+                person_id=person_id,
+                title=operation["title"],
+                description=operation.get("description"),
+                is_completed=operation["is_completed"] if isinstance(operation.get("is_completed"), bool) else False
+            )
+
+        if op not in ("update", "delete"):
+            raise InputValidationError("'op' must be one of 'create', 'update' or 'delete'.")
+
+        todo = existing_todos.get(operation.get("entity_id"))
+        if not todo:
+            raise InputValidationError("Todo not found or not authorized")
+
+        if op == "delete":
+            todo.active = False
+            return todo
+
+        # Fields that are present are applied even when empty, so a client can clear the description.
+        if "title" in operation:
+            if not operation["title"] or not str(operation["title"]).strip():
+                raise InputValidationError("'title' cannot be empty.")
+            todo.title = operation["title"]
+        if "description" in operation:
+            todo.description = operation["description"]
+        if isinstance(operation.get("is_completed"), bool):
+            todo.is_completed = operation["is_completed"]
+        return todo
@@ -0,0 +1,48 @@
+"""
+Maintain the monthly partitions of the audit tables.
+
+Creates the partitions of the coming months (and of any month whose rows sit in the default partition),
+compacts old partitions to the last version of every entity per month, and drops, optionally archiving,
+the partitions that are past the retention window. Meant to run daily; it only changes what is due.
+
+Run it with: python -m common.tasks.maintain_audit_partitions [--retention-months N] [--archive-dir DIR]
+"""
+import argparse
+
+from common.app_config import config
+from common.app_logger import logger
+from common.repositories.audit import AUDITED_TABLES, AuditPartitionManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--table', choices=AUDITED_TABLES, action='append', help="Only maintain the audit table of this table")
+    parser.add_argument('--months-ahead', type=int, default=config.AUDIT_PARTITIONS_AHEAD)
+    parser.add_argument(
+        '--retention-months', type=int, default=config.AUDIT_RETENTION_MONTHS,
+        help="Drop partitions of months that ended more than this many months ago; 0 keeps every partition"
+    )
+    parser.add_argument('--archive-dir', default=config.AUDIT_ARCHIVE_DIR, help="Write dropped partitions here as gzipped CSV")
+    parser.add_argument(
+        '--compact-after-months', type=int, default=config.AUDIT_COMPACT_AFTER_MONTHS,
+        help="Keep only the last version per entity and month in partitions this old; 0 disables compaction"
+    )
+    args = parser.parse_args()
+
+    manager = AuditPartitionManager()
+    for table_name in args.table or AUDITED_TABLES:
+        for partition in manager.create_partitions(table_name, args.months_ahead):
+            logger.info(f"Created audit partition {partition}")
+
+        if args.compact_after_months > 0:
+            for partition, deleted in manager.compact_partitions(table_name, args.compact_after_months).items():
+                if deleted:
+                    logger.info(f"Compacted audit partition {partition}, deleted {deleted} intermediate versions")
+
+        if args.retention_months > 0:
+            for partition in manager.retire_partitions(table_name, args.retention_months, args.archive_dir):
+                logger.info(f"Dropped audit partition {partition}" + (f", archived to {args.archive_dir}" if args.archive_dir else ""))
+
+
+if __name__ == '__main__':
+    main()
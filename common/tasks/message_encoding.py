@@ -0,0 +1,60 @@
+"""
+Message body encodings, told apart by the AMQP content_type and content_encoding properties.
+
+    json       content_type=application/json                            (default)
+    json+gzip  content_type=application/json, content_encoding=gzip
+    msgpack    content_type=application/msgpack                         (needs the msgpack package)
+"""
+import gzip
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+GZIP = 'gzip'
+
+ENCODINGS = {
+    'json': (JSON, None),
+    'json+gzip': (JSON, GZIP),
+    'msgpack': (MSGPACK, None),
+}
+
+
+def get_content_type(encoding: str) -> tuple:
+    """Return the (content_type, content_encoding) pair of an encoding name."""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown message encoding '{encoding}', expected one of {sorted(ENCODINGS)}.")
+    if ENCODINGS[encoding][0] == MSGPACK and msgpack is None:
+        raise ValueError("The msgpack message encoding needs the msgpack package.")
+    return ENCODINGS[encoding]
+
+
+def encode_message(data, content_type: str = JSON, content_encoding: str = None) -> bytes:
+    if content_type == MSGPACK:
+        if msgpack is None:
+            raise ValueError("The msgpack message encoding needs the msgpack package.")
+        body = msgpack.packb(data, use_bin_type=True)
+    elif content_type in (JSON, None):
+        body = json.dumps(data, separators=(',', ':') if content_encoding else None).encode()
+    else:
+        raise ValueError(f"Unsupported message content type '{content_type}'.")
+
+    if content_encoding == GZIP:
+        body = gzip.compress(body, mtime=0)
+    elif content_encoding is not None:
+        raise ValueError(f"Unsupported message content encoding '{content_encoding}'.")
+    return body
+
+
+def decode_message(body: bytes, content_type: str = JSON, content_encoding: str = None):
+    if content_encoding == GZIP:
+        body = gzip.decompress(body)
+    if content_type == MSGPACK:
+        if msgpack is None:
+            raise ValueError("The msgpack message encoding needs the msgpack package.")
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+import time
+from typing import Callable
+
+import pika
+
+from common.app_logger import logger
+
+
+class MessageSpool:
+    """
+    Append-only JSON lines file of messages that could not be published, replayed by a background thread.
+
+    Every append is fsynced, so a spooled message survives a crash of the process. The replayer moves the
+    spool aside before publishing it, so new messages keep being appended while older ones are replayed;
+    whatever could not be published stays in the moved file and is retried first on the next round.
+    """
+
+    def __init__(self, path: str, publish: Callable, replay_interval: float = 5):
+        self.path = path
+        self.replaying_path = path + '.replaying'
+        self.publish = publish
+        self.replay_interval = replay_interval
+
+        self._lock = threading.Lock()
+        self._replayer = None
+
+        # Messages spooled before a restart are replayed too.
+        if os.path.exists(self.path) or os.path.exists(self.replaying_path):
+            with self._lock:
+                self._start_replayer()
+
+    def append(self, queue_name: str, data: dict, properties: pika.BasicProperties = None, exchange_name: str = None):
+        self.append_many(queue_name, [data], properties=properties, exchange_name=exchange_name)
+
+    def append_many(self, queue_name: str, messages: list, properties: pika.BasicProperties = None, exchange_name: str = None):
+        """Append messages with a single write and fsync."""
+        properties = {key: value for key, value in vars(properties).items() if value is not None} if properties else None
+        lines = ''.join(
+            json.dumps({
+                'queue_name': queue_name,
+                'exchange_name': exchange_name,
+                'data': data,
+                'properties': properties,
+            }) + '\n'
+            for data in messages
+        )
+
+        with self._lock:
+            with open(self.path, 'a') as spool:
+                spool.write(lines)
+                spool.flush()
+                os.fsync(spool.fileno())
+            self._start_replayer()
+
+    def _start_replayer(self):
+        if self._replayer is None:
+            self._replayer = threading.Thread(target=self._run_replayer, name='message-spool-replayer', daemon=True)
+            self._replayer.start()
+
+    def _run_replayer(self):
+        while True:
+            time.sleep(self.replay_interval)
+            try:
+                self.replay()
+            except Exception:
+                logger.exception("Replaying the message spool failed")
+
+            with self._lock:
+                if not os.path.exists(self.path) and not os.path.exists(self.replaying_path):
+                    self._replayer = None
+                    return
+
+    def replay(self) -> int:
+        """Publish the spooled messages in order, stopping at the first failure. Returns the number published."""
+        with self._lock:
+            if not os.path.exists(self.replaying_path):
+                if not os.path.exists(self.path):
+                    return 0
+                os.replace(self.path, self.replaying_path)
+
+        with open(self.replaying_path) as spool:
+            lines = spool.readlines()
+
+        for index, line in enumerate(lines):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The tail of a write interrupted by a crash
+                logger.error(f"Skipping a corrupt line of the message spool {self.path}")
+                continue
+
+            properties = pika.BasicProperties(**entry['properties']) if entry['properties'] else None
+            try:
+                self.publish(entry['queue_name'], entry['data'], properties, entry['exchange_name'])
+            except Exception as e:
+                logger.warning(f"Could not replay spooled messages, {len(lines) - index} left: {e}")
+                self._rewrite(lines[index:])
+                return index
+
+        os.remove(self.replaying_path)
+        logger.info(f"Replayed {len(lines)} spooled messages")
+        return len(lines)
+
+    def _rewrite(self, lines: list):
+        temporary_path = self.replaying_path + '.tmp'
+        with open(temporary_path, 'w') as spool:
+            spool.writelines(lines)
+            spool.flush()
+            os.fsync(spool.fileno())
+        os.replace(temporary_path, self.replaying_path)
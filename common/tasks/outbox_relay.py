@@ -0,0 +1,90 @@
+"""
+Outbox relay: publishes the messages written to the outbox_message table and marks them published.
+
+Run it as its own process next to the API: python -m common.tasks.outbox_relay
+Several relays can run at once; each leases its own batch of rows.
+"""
+import argparse
+import time
+
+from common.app_config import config
+from common.app_logger import logger
+from common.repositories.factory import RepositoryFactory, RepoType
+from common.tasks.send_message import ChannelPool, MessageSender, get_connection_parameters
+
+
+class OutboxRelay:
+    # How often published rows older than OUTBOX_RETENTION_DAYS are deleted, in seconds
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, config, message_sender: MessageSender = None):
+        self.config = config
+        self.outbox_repo = RepositoryFactory(config).get_repository(RepoType.OUTBOX)
+        # A relay publishes from a single thread and must know that every message reached the broker.
+        # Failed rows stay in the outbox, so publish failures must reach the relay instead of a spool.
+        self.message_sender = message_sender or MessageSender(
+            ChannelPool(get_connection_parameters(), size=1, publisher_confirms=True), spool=None
+        )
+        self._last_purge = 0
+
+    def relay_batch(self) -> int:
+        """Publish one batch of pending messages. Returns the number of messages claimed."""
+        messages = self.outbox_repo.claim_pending(
+            limit=self.config.OUTBOX_BATCH_SIZE,
+            lease_seconds=self.config.OUTBOX_LEASE_SECONDS,
+            max_attempts=self.config.OUTBOX_MAX_ATTEMPTS
+        )
+
+        # Every destination gets its messages in one publish, confirmed once; a group is published or fails as a whole.
+        groups = {}
+        for message in messages:
+            groups.setdefault((message.queue_name, message.exchange_name), []).append(message)
+
+        published = []
+        for (queue_name, exchange_name), group in groups.items():
+            try:
+                self.message_sender.send_many(queue_name, [message.payload for message in group], exchange_name=exchange_name)
+                published += [message.entity_id for message in group]
+            except Exception as e:
+                logger.exception(f"Could not publish {len(group)} outbox message(s) to queue {queue_name}")
+                for message in group:
+                    self.outbox_repo.mark_failed(message.entity_id, str(e), retry_delay=self.config.OUTBOX_RETRY_DELAY)
+
+        self.outbox_repo.mark_published(published)
+        if messages:
+            logger.info(f"Relayed {len(published)} of {len(messages)} outbox messages")
+        return len(messages)
+
+    def purge(self):
+        deleted = self.outbox_repo.delete_published(older_than_days=self.config.OUTBOX_RETENTION_DAYS)
+        if deleted:
+            logger.info(f"Deleted {deleted} published outbox messages")
+        self._last_purge = time.monotonic()
+
+    def run(self, once: bool = False):
+        while True:
+            try:
+                claimed = self.relay_batch()
+                if time.monotonic() - self._last_purge > self.PURGE_INTERVAL:
+                    self.purge()
+            except Exception:
+                logger.exception("Outbox relay iteration failed")
+                claimed = 0
+
+            if once:
+                return
+            # A full batch means there is probably more waiting, so only idle when the outbox is drained.
+            if claimed < self.config.OUTBOX_BATCH_SIZE:
+                time.sleep(self.config.OUTBOX_POLL_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help="Relay a single batch and exit")
+    args = parser.parse_args()
+
+    OutboxRelay(config).run(once=args.once)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""
+Recount the todo_stats counters from the todo table and fix the rows that drifted.
+
+TodoService keeps todo_stats up to date on every todo write; writes that bypass it (manual SQL, restored
+backups) leave the counters wrong until this runs.
+
+Run it with: python -m common.tasks.recompute_todo_stats [--person-id PERSON_ID]
+"""
+import argparse
+
+from common.app_config import config
+from common.app_logger import logger
+from common.services import TodoService
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--person-id', help="Recount only the todos of this person")
+    args = parser.parse_args()
+
+    corrected = TodoService(config).recompute_todo_stats(args.person_id)
+    logger.info(f"Recomputed todo stats, corrected {len(corrected)} people")
+    for person_id in corrected:
+        logger.info(f"Corrected todo stats of person {person_id}")
+
+
+if __name__ == '__main__':
+    main()
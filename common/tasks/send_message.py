@@ -1,10 +1,17 @@
 import pika
-import json
+import queue
+import threading
 import time
+from contextlib import contextmanager
+from typing import Optional
+from pika.exceptions import AMQPError, AMQPConnectionError, ChannelClosed, ChannelWrongStateError
 from pika.exchange_type import ExchangeType
 
 from common.app_config import config
 from common.app_logger import logger
+from common.tasks.message_encoding import encode_message, get_content_type
+from common.tasks.message_spool import MessageSpool
+from common.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
 
 
 def get_connection_parameters() -> pika.ConnectionParameters:
@@ -15,7 +22,10 @@ def get_connection_parameters() -> pika.ConnectionParameters:
         credentials=pika.credentials.PlainCredentials(
             username=config.RABBITMQ_USER,
             password=config.RABBITMQ_PASSWORD
-        )
+        ),
+        socket_timeout=config.RABBITMQ_SOCKET_TIMEOUT,
+        stack_timeout=config.RABBITMQ_SOCKET_TIMEOUT,
+        blocked_connection_timeout=config.RABBITMQ_SOCKET_TIMEOUT
     )
 
 def establish_connection(parameters: pika.ConnectionParameters, max_retries: int = 10) -> pika.BlockingConnection:
@@ -33,38 +43,279 @@ def establish_connection(parameters: pika.ConnectionParameters, max_retries: int
                 logger.error("Error connecting to RabbitMQ after multiple retries")
                 raise e
 
+class PooledChannel:
+    """A long-lived connection with its channel and the queues and exchanges already declared through it."""
+
+    def __init__(self, connection: pika.BlockingConnection, publisher_confirms: bool = False):
+        self.connection = connection
+        self.publisher_confirms = publisher_confirms
+        self.channel = connection.channel()
+        if publisher_confirms:
+            self.channel.confirm_delivery()
+        self._batch_channel = None
+        self.declared_queues = set()
+        self.declared_exchanges = set()
+
+    @property
+    def is_open(self) -> bool:
+        return self.connection.is_open and self.channel.is_open
+
+    def declare_exchange(self, exchange_name: str):
+        if exchange_name not in self.declared_exchanges:
+            self.channel.exchange_declare(exchange=exchange_name, exchange_type=ExchangeType.topic.value, durable=True)
+            self.declared_exchanges.add(exchange_name)
+
+    def declare_queue(self, queue_name: str):
+        if queue_name not in self.declared_queues:
+            self.channel.queue_declare(queue=queue_name, durable=True)
+            self.declared_queues.add(queue_name)
+
+    def publish(self, exchange_name: str, routing_key: str, bodies: list, properties: pika.BasicProperties):
+        """
+        Publish the bodies in order.
+
+        With publisher confirms a blocking channel waits for the broker after every message, so a batch goes
+        through a second channel in transaction mode instead: one commit covers the whole batch, which the
+        broker accepts or rejects as a whole.
+        """
+        if self.publisher_confirms and len(bodies) > 1:
+            if self._batch_channel is None or not self._batch_channel.is_open:
+                self._batch_channel = self.connection.channel()
+                self._batch_channel.tx_select()
+            channel = self._batch_channel
+        else:
+            channel = self.channel
+
+        for body in bodies:
+            channel.basic_publish(exchange=exchange_name, routing_key=routing_key, body=body, properties=properties)
+
+        if channel is self._batch_channel:
+            channel.tx_commit()
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except AMQPError:
+            pass
+
+
+class ChannelPool:
+    """
+    Thread-safe pool of long-lived RabbitMQ connections, each with one channel.
+
+    A BlockingConnection must not be used by two threads at once, so a channel is checked out for a whole
+    publish and handed back afterwards. At most `size` connections are open; callers wait up to `timeout`
+    seconds for one. A channel that failed is closed instead of being returned, and idle channels are checked
+    (which also answers pending heartbeats) before being reused, so a dropped connection is replaced on next use.
+
+    With a `circuit_breaker`, connection failures open the circuit and checkouts then fail at once with
+    CircuitOpenError instead of trying to reach a broker that is down.
+    """
+
+    # Failures that tell the broker is unreachable, as opposed to a rejected publish
+    CONNECTION_ERRORS = (AMQPConnectionError, ChannelWrongStateError, OSError)
+
+    def __init__(
+            self, parameters: pika.ConnectionParameters, size: int = 4, timeout: float = 10,
+            publisher_confirms: bool = False, circuit_breaker: CircuitBreaker = None, connect_retries: int = 10
+    ):
+        self.parameters = parameters
+        self.size = size
+        self.timeout = timeout
+        self.publisher_confirms = publisher_confirms
+        self.circuit_breaker = circuit_breaker
+        self.connect_retries = connect_retries
+
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _get_idle(self) -> Optional[PooledChannel]:
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            try:
+                if pooled.is_open:
+                    pooled.connection.process_data_events(time_limit=0)
+                    if pooled.is_open:
+                        return pooled
+            except AMQPError:
+                pass
+            logger.info("Dropping a closed RabbitMQ connection from the pool")
+            pooled.close()
+
+    @contextmanager
+    def channel(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("Timed out waiting for a RabbitMQ channel.")
+        # Checked once a slot is held, so a half open trial call always reports back to the breaker.
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow_request():
+            self._slots.release()
+            raise CircuitOpenError("The RabbitMQ circuit is open.")
+
+        pooled = None
+        try:
+            pooled = self._get_idle() or PooledChannel(
+                establish_connection(self.parameters, max_retries=self.connect_retries), self.publisher_confirms
+            )
+            yield pooled
+        except BaseException as e:
+            if pooled is not None:
+                pooled.close()
+                pooled = None
+            if self.circuit_breaker is not None:
+                if isinstance(e, self.CONNECTION_ERRORS):
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+            raise
+        else:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_success()
+        finally:
+            if pooled is not None:
+                self._idle.put(pooled)
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_channel_pool = None
+_message_spool = None
+_shared_lock = threading.RLock()
+
+
+def get_channel_pool() -> ChannelPool:
+    """Return the channel pool shared by every MessageSender of the process."""
+    global _channel_pool
+    if _channel_pool is None:
+        with _shared_lock:
+            if _channel_pool is None:
+                _channel_pool = ChannelPool(
+                    get_connection_parameters(),
+                    size=config.RABBITMQ_CHANNEL_POOL_SIZE,
+                    timeout=config.RABBITMQ_CHANNEL_POOL_TIMEOUT,
+                    publisher_confirms=config.RABBITMQ_PUBLISHER_CONFIRMS,
+                    circuit_breaker=CircuitBreaker(
+                        failure_threshold=config.RABBITMQ_BREAKER_FAILURE_THRESHOLD,
+                        reset_timeout=config.RABBITMQ_BREAKER_RESET_TIMEOUT
+                    ),
+                    # Requests must not sleep between connection attempts; the spool covers an unreachable broker.
+                    connect_retries=1
+                )
+    return _channel_pool
+
+
+def get_message_spool() -> Optional[MessageSpool]:
+    """Return the spool shared by every MessageSender of the process, or None when RABBITMQ_SPOOL_PATH is empty."""
+    global _message_spool
+    if _message_spool is None and config.RABBITMQ_SPOOL_PATH:
+        with _shared_lock:
+            if _message_spool is None:
+                sender = MessageSender(get_channel_pool(), spool=None)
+                _message_spool = MessageSpool(
+                    config.RABBITMQ_SPOOL_PATH,
+                    publish=lambda queue_name, data, properties, exchange_name: sender.send_message(
+                        queue_name, data, properties=properties, exchange_name=exchange_name
+                    ),
+                    replay_interval=config.RABBITMQ_SPOOL_REPLAY_INTERVAL
+                )
+    return _message_spool
+
+
+_DEFAULT = object()
+
+
 class MessageSender:
-    def __init__(self):
-        self.parameters = get_connection_parameters()
+    # Errors after which the message is published once more on a fresh connection
+    RETRY_ERRORS = (AMQPConnectionError, ChannelClosed, ChannelWrongStateError)
+    # Errors after which the message goes to the spool instead
+    SPOOL_ERRORS = (CircuitOpenError, TimeoutError, OSError) + RETRY_ERRORS
 
-    def send_message(self, queue_name: str, data: dict, properties: pika.BasicProperties = None, exchange_name: str = None) -> None:
+    def __init__(self, channel_pool: ChannelPool = None, spool: Optional[MessageSpool] = _DEFAULT):
+        """
+        With the default `spool` messages that cannot be published are spooled to disk when the process has a
+        spool configured; pass spool=None for callers that must see publish failures, e.g. the outbox relay.
         """
-        Sends a message to the specified RabbitMQ queue.
+        self.channel_pool = channel_pool or get_channel_pool()
+        self.spool = get_message_spool() if spool is _DEFAULT else spool
+
+    def send_message(
+            self, queue_name: str, data: dict, properties: pika.BasicProperties = None, exchange_name: str = None,
+            encoding: str = None
+    ) -> None:
+        """
+        Sends a message to the specified RabbitMQ queue over a pooled channel.
+
+        When the broker cannot be reached the message is appended to the spool and replayed later.
 
         :param queue_name: Name of the RabbitMQ queue to send the message to.
         :param data: The data to send to the queue as a dictionary.
+        :param encoding: Body encoding (json, json+gzip or msgpack), RABBITMQ_MESSAGE_ENCODING by default.
         :return: None
         """
-        connection = establish_connection(self.parameters)
+        self.send_many(queue_name, [data], properties=properties, exchange_name=exchange_name, encoding=encoding)
 
-        with connection:
-            channel = connection.channel()
+    def send_many(
+            self, queue_name: str, messages: list, properties: pika.BasicProperties = None, exchange_name: str = None,
+            encoding: str = None
+    ) -> None:
+        """
+        Sends several messages to the specified RabbitMQ queue over one channel, in order.
 
-            if properties is None:
-                properties = pika.BasicProperties(
-                    delivery_mode=2,  # Make the message persistent
-                )
+        With publisher confirms the batch is committed, and waited for, once.
+        """
+        if not messages:
+            return
+        properties = self._get_properties(properties, encoding)
+        bodies = [encode_message(data, properties.content_type, properties.content_encoding) for data in messages]
 
-            if exchange_name is None:
-                exchange_name = ""
-            else:
-                channel.exchange_declare(exchange=exchange_name, exchange_type=ExchangeType.topic.value, durable=True)
-
-            channel.queue_declare(queue=queue_name, durable=True)
-            channel.basic_publish(
-                exchange=exchange_name,
-                routing_key=queue_name,
-                body=json.dumps(data).encode(),
-                properties=properties,
+        try:
+            self._publish(queue_name, bodies, properties, exchange_name)
+        except self.SPOOL_ERRORS as e:
+            if self.spool is None:
+                raise
+            self.spool.append_many(queue_name, messages, properties=properties, exchange_name=exchange_name)
+            logger.warning(f"Could not publish to queue {queue_name}, {len(messages)} message(s) spooled: {e}")
+            return
+
+        logger.info(f"Sent {len(messages)} message(s) to queue: {queue_name}")
+
+    @staticmethod
+    def _get_properties(properties: pika.BasicProperties = None, encoding: str = None) -> pika.BasicProperties:
+        if properties is None:
+            properties = pika.BasicProperties(
+                delivery_mode=2,  # Make the message persistent
             )
-            logger.info(f"Sent message to queue: {queue_name}")
+        # An explicit content type (e.g. of a replayed message) decides the encoding.
+        if properties.content_type is None:
+            properties.content_type, properties.content_encoding = get_content_type(
+                encoding or config.RABBITMQ_MESSAGE_ENCODING
+            )
+        return properties
+
+    def _publish(self, queue_name: str, bodies: list, properties: pika.BasicProperties, exchange_name: str = None):
+        for attempt in range(2):
+            checked_out = False
+            try:
+                with self.channel_pool.channel() as pooled:
+                    checked_out = True
+                    # The default exchange ("") cannot be declared.
+                    if exchange_name:
+                        pooled.declare_exchange(exchange_name)
+
+                    pooled.declare_queue(queue_name)
+                    pooled.publish(exchange_name or "", queue_name, bodies, properties)
+                return
+            except self.RETRY_ERRORS as e:
+                # Only a connection that broke while in use is worth a second try; a failed connect is not.
+                if attempt or not checked_out:
+                    raise
+                logger.warning(f"RabbitMQ connection lost while publishing to {queue_name}, retrying: {e}")
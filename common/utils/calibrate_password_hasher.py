@@ -0,0 +1,100 @@
+"""
+Benchmark scrypt password hashing on this machine and recommend PASSWORD_HASH_METHOD.
+
+Every candidate N (with the given r and p) is timed for hashing and verification, with `--workers` processes
+hashing at once like the PasswordHasher pool does, since scrypt is memory-bandwidth bound and slows down under
+concurrency. The recommendation is the most expensive candidate whose p99 stays within `--target-p99-ms`.
+Logins rehash passwords stored with other parameters, so the result can be applied without a migration.
+
+Run from the repository root: python -m common.utils.calibrate_password_hasher --output .env.password
+"""
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+SAMPLE_PASSWORD = 'Calibrate@Password123'
+
+
+def _time_hash(method: str) -> float:
+    start = time.perf_counter()
+    generate_password_hash(SAMPLE_PASSWORD, method=method)
+    return time.perf_counter() - start
+
+
+def _time_verify(pwhash: str) -> float:
+    start = time.perf_counter()
+    check_password_hash(pwhash, SAMPLE_PASSWORD)
+    return time.perf_counter() - start
+
+
+def _percentile(samples: list, percentile: float) -> float:
+    samples = sorted(samples)
+    index = min(len(samples) - 1, max(0, round(percentile / 100 * len(samples) + 0.5) - 1))
+    return samples[index]
+
+
+def benchmark(executor: ProcessPoolExecutor, method: str, iterations: int) -> dict:
+    pwhash = generate_password_hash(SAMPLE_PASSWORD, method=method)
+    hash_times = list(executor.map(_time_hash, [method] * iterations))
+    verify_times = list(executor.map(_time_verify, [pwhash] * iterations))
+
+    _, n, r, p = method.split(':')
+    return {
+        'method': method,
+        # scrypt needs 128 * N * r bytes of working memory per hash in flight
+        'memory_mib': 128 * int(n) * int(r) / 2**20,
+        'hash_p50_ms': _percentile(hash_times, 50) * 1000,
+        'hash_p99_ms': _percentile(hash_times, 99) * 1000,
+        'verify_p50_ms': _percentile(verify_times, 50) * 1000,
+        'verify_p99_ms': _percentile(verify_times, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target-p99-ms', type=float, default=250, help="Latency budget of a hash or a verify")
+    parser.add_argument('--log2-n', type=int, nargs='+', default=[14, 15, 16, 17], help="Candidate log2(N) values")
+    parser.add_argument('-r', type=int, default=8, help="scrypt block size")
+    parser.add_argument('-p', type=int, default=1, help="scrypt parallelization")
+    parser.add_argument('--workers', type=int, default=2, help="Concurrent hashes, as PASSWORD_HASHER_WORKERS")
+    parser.add_argument('--iterations', type=int, default=50, help="Hashes and verifies per candidate")
+    parser.add_argument('--output', help="Write the recommended setting to this env file")
+    args = parser.parse_args()
+
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        for log2_n in sorted(args.log2_n):
+            result = benchmark(executor, f"scrypt:{2**log2_n}:{args.r}:{args.p}", args.iterations)
+            results.append(result)
+            print(
+                f"{result['method']:<22} {result['memory_mib']:7.1f} MiB"
+                f"  hash p50 {result['hash_p50_ms']:8.1f} ms  p99 {result['hash_p99_ms']:8.1f} ms"
+                f"  verify p50 {result['verify_p50_ms']:8.1f} ms  p99 {result['verify_p99_ms']:8.1f} ms"
+            )
+
+    within_target = [
+        result for result in results
+        if max(result['hash_p99_ms'], result['verify_p99_ms']) <= args.target_p99_ms
+    ]
+    if not within_target:
+        print(f"No candidate meets a p99 of {args.target_p99_ms} ms with {args.workers} workers.")
+        return 1
+
+    recommended = within_target[-1]
+    setting = f"PASSWORD_HASH_METHOD={recommended['method']}"
+    print(f"Recommended: {setting}")
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(
+                f"# Calibrated for a p99 of {args.target_p99_ms} ms with {args.workers} concurrent hashes\n"
+                f"{setting}\n"
+            )
+        print(f"Written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
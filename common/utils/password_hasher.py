@@ -0,0 +1,162 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from app.helpers.exceptions import APIException
+from common.app_config import config
+from common.app_logger import logger
+
+
+class PasswordHasherBusyError(APIException):
+    pass
+
+
+def normalize_hash_method(method: str) -> str:
+    """Spell out the cost parameters werkzeug fills in, e.g. 'scrypt' -> 'scrypt:32768:8:1'."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args) if args else (2**15, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    raise ValueError(f"Invalid hash method '{method}'.")
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords in a bounded pool of worker processes.
+
+    At most `workers` operations run at once; other callers wait up to `queue_timeout` seconds for a slot and
+    then fail with PasswordHasherBusyError, so a burst of logins or signups cannot take every CPU of the process.
+    With `workers` set to 0 the work runs on the calling thread, still under a single slot.
+
+    Every `stats_log_interval` seconds (0 disables it) an operation logs the queue depth and latency stats.
+    """
+
+    def __init__(self, workers: int = 2, queue_timeout: float = 5, method: str = 'scrypt', stats_log_interval: float = 0):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.method = normalize_hash_method(method)
+        self.stats_log_interval = stats_log_interval
+        self._stats_logged_at = time.monotonic()
+
+        self._slots = threading.BoundedSemaphore(max(workers, 1))
+        self._executor = None
+        self._lock = threading.Lock()
+
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.total_run_time = 0.0
+        self.max_run_time = 0.0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Forking a threaded server can copy held locks into the child, so workers are spawned instead.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def _run(self, func, *args, **kwargs):
+        queued_at = time.monotonic()
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+
+        started_at = time.monotonic()
+        with self._lock:
+            self.queue_depth -= 1
+            if not acquired:
+                self.rejected += 1
+            else:
+                self.in_flight += 1
+                wait_time = started_at - queued_at
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+
+        if not acquired:
+            self._log_stats_if_due()
+            raise PasswordHasherBusyError("The server is busy, please try again shortly.")
+
+        try:
+            if self.workers > 0:
+                return self._get_executor().submit(func, *args, **kwargs).result()
+            return func(*args, **kwargs)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); build a fresh pool for the next call.
+            with self._lock:
+                self._executor = None
+            raise
+        finally:
+            self._slots.release()
+            run_time = time.monotonic() - started_at
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+                self.total_run_time += run_time
+                self.max_run_time = max(self.max_run_time, run_time)
+            self._log_stats_if_due()
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """Tell whether a stored hash was made with other parameters than the configured method."""
+        return pwhash.split('$', 1)[0] != self.method
+
+    def stats(self) -> dict:
+        with self._lock:
+            admitted = self.completed + self.in_flight
+            return {
+                'workers': self.workers,
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_wait_time': self.total_wait_time / admitted if admitted else 0.0,
+                'max_wait_time': self.max_wait_time,
+                'avg_run_time': self.total_run_time / self.completed if self.completed else 0.0,
+                'max_run_time': self.max_run_time,
+            }
+
+    def _log_stats_if_due(self):
+        if not self.stats_log_interval:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._stats_logged_at < self.stats_log_interval:
+                return
+            self._stats_logged_at = now
+        logger.info(f"Password hasher stats: {self.stats()}")
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+password_hasher = PasswordHasher(
+    workers=config.PASSWORD_HASHER_WORKERS,
+    queue_timeout=config.PASSWORD_HASHER_QUEUE_TIMEOUT,
+    method=config.PASSWORD_HASH_METHOD,
+    stats_log_interval=config.PASSWORD_HASHER_STATS_LOG_INTERVAL
+)
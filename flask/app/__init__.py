@@ -1,3 +1,5 @@
+import math
+
 from flask import Flask, g, Request
 from flask_restx import Api
 from flask_cors import CORS
@@ -7,6 +9,7 @@ from rococo.plugins.pooled_connection import PooledConnectionPlugin
 from rococo.models.versioned_model import ModelValidationError
 
 from app.helpers.exceptions import InputValidationError, APIException
+from app.helpers.json_provider import get_json_provider_class
 
 from common.app_config import get_config
 from common.utils.version import get_service_version, get_project_name
@@ -29,10 +32,23 @@ def create_app():
 
     app = Flask(__name__)
     app.config.from_object(config)
+    app.json = get_json_provider_class(config.JSON_PROVIDER)(app)
 
     with app.app_context():
         set_request_exception_signal(app)
 
+    # Imported here: the hasher module imports app.helpers, which would import it back.
+    from common.utils.password_hasher import PasswordHasherBusyError, password_hasher
+
+    # Load shedding: tell clients and load balancers to back off and retry instead of failing the request.
+    # Registered on the API, so it also applies when Flask-Restx does not propagate exceptions to the app.
+    @api.errorhandler(PasswordHasherBusyError)
+    def handle_password_hasher_busy_error(exception):
+        return (
+            dict(success=False, message=str(exception)), 503,
+            {'Retry-After': str(math.ceil(password_hasher.queue_timeout))}
+        )
+
     # Register views
     from app.views import initialize_views
     initialize_views(api)
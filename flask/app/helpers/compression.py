@@ -0,0 +1,81 @@
+import gzip
+from typing import List, Optional
+
+from flask import Response, request
+
+from common.app_config import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _gzip(data: bytes, level: int) -> bytes:
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _brotli(data: bytes, level: int) -> bytes:
+    return brotli.compress(data, quality=level)
+
+
+def _zstd(data: bytes, level: int) -> bytes:
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# Content-Encoding token -> (compress function, name of its level setting); codecs whose package is missing are left out.
+CODECS = {'gzip': (_gzip, 'COMPRESSION_GZIP_LEVEL')}
+if brotli is not None:
+    CODECS['br'] = (_brotli, 'COMPRESSION_BROTLI_LEVEL')
+if zstandard is not None:
+    CODECS['zstd'] = (_zstd, 'COMPRESSION_ZSTD_LEVEL')
+
+
+def get_encodings() -> List[str]:
+    """The available encodings of COMPRESSION_ENCODINGS, in order of preference."""
+    encodings = (encoding.strip() for encoding in config.COMPRESSION_ENCODINGS.split(','))
+    return [encoding for encoding in encodings if encoding in CODECS]
+
+
+def compress(data: bytes, encoding: str, level: int = None) -> bytes:
+    compress_function, level_setting = CODECS[encoding]
+    return compress_function(data, getattr(config, level_setting) if level is None else level)
+
+
+def negotiate_encoding() -> Optional[str]:
+    """The encoding for the current request: the client's highest rated one, ties going to our preference."""
+    encodings = get_encodings()
+    if not encodings:
+        return None
+    return request.accept_encodings.best_match(encodings)
+
+
+def compress_response(response: Response) -> Response:
+    """
+    Compress the body of `response` with the negotiated encoding when it is at least COMPRESSION_MIN_SIZE bytes.
+
+    A strong ETag gets the encoding appended, since the compressed body is a different representation.
+    """
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+
+    data = response.get_data()
+    if len(data) < config.COMPRESSION_MIN_SIZE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
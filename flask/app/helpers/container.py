@@ -0,0 +1,80 @@
+import threading
+from functools import wraps
+from inspect import signature
+
+from common.app_config import config
+from common.services import (
+    AuthService, EmailService, LoginMethodService, OrganizationService, PersonService,
+    PersonOrganizationRoleService, TodoService
+)
+
+
+class ServiceContainer:
+    """
+    Lazily builds services as process singletons.
+
+    Services hold no request state, so each one is built on first use and shared by every request.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._providers = {}
+        self._singletons = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory):
+        self._providers[name] = factory
+
+    def __contains__(self, name: str):
+        return name in self._providers
+
+    def _get_singleton(self, name: str, factory):
+        service = self._singletons.get(name)
+        if service is None:
+            with self._lock:
+                service = self._singletons.get(name)
+                if service is None:
+                    service = self._singletons[name] = factory(self.config)
+        return service
+
+    def get(self, name: str):
+        if name not in self._providers:
+            raise KeyError(f"No service registered with the name '{name}'")
+
+        return self._get_singleton(name, self._providers[name])
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self.get(name)
+        except KeyError as e:
+            raise AttributeError(str(e))
+
+
+services = ServiceContainer(config)
+services.register('auth_service', AuthService)
+services.register('email_service', EmailService)
+services.register('login_method_service', LoginMethodService)
+services.register('organization_service', OrganizationService)
+services.register('person_service', PersonService)
+services.register('person_organization_role_service', PersonOrganizationRoleService)
+services.register('todo_service', TodoService)
+
+
+def inject_services():
+    """Pass registered services to the view as keyword arguments matched by parameter name."""
+    def decorator(func):
+        func_params = signature(func).parameters
+        service_names = [name for name in func_params if name in services]
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for name in service_names:
+                if name not in kwargs:
+                    kwargs[name] = services.get(name)
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
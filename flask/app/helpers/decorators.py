@@ -7,11 +7,7 @@ from inspect import signature
 from common.app_logger import logger
 from common.app_config import config
 
-from common.services.email import EmailService
-from common.services.person import PersonService
-from common.services.auth import AuthService
-from common.services.auth import AuthService
-from common.services import OrganizationService, PersonOrganizationRoleService
+from app.helpers.container import services
 
 
 
@@ -22,9 +18,7 @@ def login_required():
             if 'Authorization' not in request.headers:
                 return get_failure_response(message="Authorization header not present", status_code=401)
             
-            auth_service = AuthService(config)
-            email_service = EmailService(config)
-            person_service = PersonService(config)
+            auth_service = services.auth_service
 
             data = request.headers['Authorization']
             token = str.replace(str(data), 'Bearer ', '')
@@ -34,11 +28,7 @@ def login_required():
                 if not parsed_token:
                     return get_failure_response(message='Access token is invalid', status_code=401)
 
-                person_id = parsed_token.get('person_id')
-                email_id = parsed_token.get('email_id')
-
-                email = email_service.get_email_by_id(email_id)
-                person = person_service.get_person_by_id(person_id)
+                person, email = auth_service.get_person_and_email_from_token(parsed_token)
 
                 g.person = person
                 g.email = email
@@ -76,19 +66,18 @@ def organization_required(with_roles=None):
             if not person:
                 raise Exception("organization_required decorator should be used after login_required decorator.")
 
-            organization_service = OrganizationService(config)
-            person_organization_role_service = PersonOrganizationRoleService(config)
+            organization_service = services.organization_service
+            person_organization_role_service = services.person_organization_role_service
 
             organization_id = request.headers['x-organization-id']
-            organization = organization_service.get_organization_by_id(organization_id)
-            if not organization:
-                return get_failure_response(message='Organization ID is invalid', status_code=403)
-            
-            person_organization_role = person_organization_role_service.get_role_of_person_in_organization(
+            organization, person_organization_role = person_organization_role_service.get_membership(
                 person_id=person.entity_id,
-                organization_id=organization.entity_id
+                organization_id=organization_id
             )
             if not person_organization_role:
+                # Only failed lookups go back to the database, to tell an unknown organization apart.
+                if not organization_service.get_organization_by_id(organization_id):
+                    return get_failure_response(message='Organization ID is invalid', status_code=403)
                 return get_failure_response(message="User is not authorized to use this organization.", status_code=401)
 
             # If with_roles is specified, verify the user's role is allowed.
@@ -1,4 +1,7 @@
-from flask import current_app as app
+import hashlib
+
+from flask import current_app as app, request
+from app.helpers.compression import compress_response, get_encodings
 from app.helpers.exceptions import InputValidationError
 
 
@@ -21,13 +24,15 @@ def validate_required_fields_from_list(fields_dict, required_fields_list):
             raise InputValidationError(f"'{field}' is required and cannot be empty.")
 
 
-def _get_response(data, status_code=200):
+def _get_response(data, status_code=200, etag=None):
     response = app.response_class(
         response=app.json.dumps(data),
         status=status_code,
         mimetype=app.config['MIME_TYPE']
     )
-    return response
+    if etag is not None:
+        response.set_etag(etag)
+    return compress_response(response)
 
 
 def get_failure_response(message, status_code=200):
@@ -38,3 +43,47 @@ def get_failure_response(message, status_code=200):
 def get_success_response(status_code=200, **data):
     response = _get_response(dict(success=True, **data), status_code)
     return response
+
+
+def get_etag(*parts) -> str:
+    """
+    A strong ETag for a response that is fully determined by `parts`, such as entity ids, versions and counts.
+
+    Every save gives an entity a new version, so the tag changes whenever the response would.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def get_conditional_response(etag, status_code=200, **data):
+    """
+    `get_success_response` for GET requests, tagged with `etag`.
+
+    When the request's If-None-Match still matches the tag, answers 304 Not Modified without serializing `data`.
+    """
+    matched_tag = _match_etag(etag)
+    if matched_tag is not None:
+        response = app.response_class(status=304)
+        response.set_etag(matched_tag)
+        # A 304 carries the Vary of the 200 it stands for; the body size that decides compression is unknown here.
+        if get_encodings():
+            response.vary.add('Accept-Encoding')
+    else:
+        response = _get_response(dict(success=True, **data), status_code, etag=etag)
+    # Let clients keep the body but revalidate it on every use.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _match_etag(etag):
+    """The tag of If-None-Match that matches `etag`, also when it carries the suffix of a compressed representation."""
+    if_none_match = request.if_none_match
+    if if_none_match.star_tag:
+        return etag
+    for tag in if_none_match.as_set(include_weak=True):
+        if tag.split('-', 1)[0] == etag:
+            return tag
+    return None
@@ -0,0 +1,16 @@
+revision = "0000000007"
+down_revision = "0000000006"
+
+
+
+def upgrade(migration):
+    # Supports keyset pagination of a person's todos ordered by (changed_on, entity_id)
+    migration.add_index("todo", "todo_person_id_changed_on_entity_id_ind", "person_id, changed_on, entity_id")
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.remove_index("todo", "todo_person_id_changed_on_entity_id_ind")
+
+    migration.update_version_table(version=down_revision)
@@ -0,0 +1,19 @@
+revision = "0000000008"
+down_revision = "0000000007"
+
+
+
+def upgrade(migration):
+    # Covers the paginated organization listing of a person, which reads role and filters on active
+    migration.add_index(
+        "person_organization_role", "person_organization_role_person_id_organization_id_role_ind",
+        "person_id, organization_id, role, active"
+    )
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.remove_index("person_organization_role", "person_organization_role_person_id_organization_id_role_ind")
+
+    migration.update_version_table(version=down_revision)
@@ -0,0 +1,38 @@
+revision = "0000000009"
+down_revision = "0000000008"
+
+
+
+def upgrade(migration):
+    # Outbox messages are written in the same transaction as the domain writes and published by the outbox relay
+    migration.create_table(
+        "outbox_message",
+        """
+            "entity_id" varchar(32) NOT NULL,
+            "version" varchar(32) NOT NULL,
+            "previous_version" varchar(32) DEFAULT '00000000000000000000000000000000',
+            "active" boolean DEFAULT true,
+            "changed_by_id" varchar(32) DEFAULT NULL,
+            "changed_on" timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+            "queue_name" varchar(255) NOT NULL,
+            "exchange_name" varchar(255) DEFAULT NULL,
+            "payload" jsonb NOT NULL,
+            "attempts" integer DEFAULT 0,
+            "published_on" timestamp NULL DEFAULT NULL,
+            "last_error" text DEFAULT NULL,
+            "locked_until" timestamp NULL DEFAULT NULL,
+            PRIMARY KEY ("entity_id")
+        """
+    )
+    # Only unpublished rows are scanned by the relay, so they get their own small index
+    migration.execute(
+        "CREATE INDEX outbox_message_pending_ind ON outbox_message (changed_on, entity_id) WHERE published_on IS NULL;"
+    )
+    migration.add_index("outbox_message", "outbox_message_published_on_ind", "published_on")
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.drop_table(table_name="outbox_message")
+    migration.update_version_table(version=down_revision)
@@ -0,0 +1,20 @@
+revision = "0000000010"
+down_revision = "0000000009"
+
+
+
+def upgrade(migration):
+    # Full-text search over a person's todos. An expression index rather than a stored tsvector column, so the
+    # todo table keeps the columns of todo_audit; queries must use the same expression (TodoRepository.SEARCH_VECTOR).
+    migration.execute(
+        "CREATE INDEX todo_search_ind ON todo USING GIN "
+        "(to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, '')));"
+    )
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.remove_index("todo", "todo_search_ind")
+
+    migration.update_version_table(version=down_revision)
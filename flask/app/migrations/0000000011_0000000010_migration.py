@@ -0,0 +1,29 @@
+revision = "0000000011"
+down_revision = "0000000010"
+
+
+
+def upgrade(migration):
+    # Active and completed todo counts per person, kept up to date by TodoService in the transaction of every todo write
+    migration.create_table(
+        "todo_stats",
+        """
+            "person_id" varchar(32) NOT NULL,
+            "total_count" integer NOT NULL DEFAULT 0,
+            "completed_count" integer NOT NULL DEFAULT 0,
+            "changed_on" timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY ("person_id")
+        """
+    )
+    migration.execute(
+        "INSERT INTO todo_stats (person_id, total_count, completed_count) "
+        "SELECT person_id, COUNT(*), COUNT(*) FILTER (WHERE is_completed) FROM todo WHERE active GROUP BY person_id;"
+    )
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    migration.drop_table(table_name="todo_stats")
+
+    migration.update_version_table(version=down_revision)
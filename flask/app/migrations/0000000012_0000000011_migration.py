@@ -0,0 +1,36 @@
+revision = "0000000012"
+down_revision = "0000000011"
+
+AUDITED_TABLES = ["organization", "person", "email", "login_method", "person_organization_role", "todo"]
+
+
+def upgrade(migration):
+    # Copies the previous version of a row to its audit table for AUDIT_STRATEGY=trigger. It only acts in
+    # transactions that opt in, so saves that write the audit row themselves are not audited twice.
+    migration.execute(
+        """
+        CREATE OR REPLACE FUNCTION audit_previous_version() RETURNS trigger AS $$
+        BEGIN
+            IF current_setting('app.audit_trigger', true) = 'on' THEN
+                EXECUTE 'INSERT INTO ' || quote_ident(TG_TABLE_NAME || '_audit') || ' SELECT ($1).*' USING OLD;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table_name in AUDITED_TABLES:
+        migration.execute(
+            f"CREATE TRIGGER {table_name}_audit_trg BEFORE UPDATE ON {table_name} "
+            f"FOR EACH ROW EXECUTE FUNCTION audit_previous_version();"
+        )
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    for table_name in AUDITED_TABLES:
+        migration.execute(f"DROP TRIGGER IF EXISTS {table_name}_audit_trg ON {table_name};")
+    migration.execute("DROP FUNCTION IF EXISTS audit_previous_version();")
+
+    migration.update_version_table(version=down_revision)
@@ -0,0 +1,76 @@
+revision = "0000000013"
+down_revision = "0000000012"
+
+AUDITED_TABLES = ["organization", "person", "email", "login_method", "person_organization_role", "todo"]
+
+
+def upgrade(migration):
+    # Range partition the audit tables by month of changed_on, so old history can be dropped or archived a
+    # partition at a time (common/tasks/maintain_audit_partitions.py). Partitions are named {table}_audit_pYYYYMM;
+    # rows outside of them land in {table}_audit_default until the maintenance task moves them out.
+    # The column order stays the one of the main table, which the audit copies (SELECT *) rely on.
+    for table_name in AUDITED_TABLES:
+        audit_table = f"{table_name}_audit"
+        migration.change_table_name(audit_table, f"{audit_table}_unpartitioned")
+        migration.execute(f"ALTER TABLE {audit_table}_unpartitioned RENAME CONSTRAINT {audit_table}_pkey TO {audit_table}_unpartitioned_pkey;")
+        # changed_on becomes part of the primary key, so it cannot be NULL; rococo always sets it, older rows may not.
+        migration.execute(
+            f"UPDATE {audit_table}_unpartitioned SET changed_on = TIMESTAMP 'epoch' WHERE changed_on IS NULL;"
+        )
+        migration.execute(
+            f"""
+            CREATE TABLE {audit_table} (
+                LIKE {audit_table}_unpartitioned INCLUDING DEFAULTS,
+                PRIMARY KEY ("entity_id", "version", "changed_on")
+            ) PARTITION BY RANGE ("changed_on");
+            """
+        )
+        migration.execute(f"CREATE TABLE {audit_table}_default PARTITION OF {audit_table} DEFAULT;")
+        # One partition per month from the oldest dated row up to two months ahead; rows that had no changed_on
+        # stay in the default partition for the maintenance task.
+        migration.execute(
+            f"""
+            DO $$
+            DECLARE
+                month timestamp;
+            BEGIN
+                FOR month IN SELECT generate_series(
+                    date_trunc('month', COALESCE((SELECT MIN(changed_on) FILTER (WHERE changed_on > TIMESTAMP 'epoch') FROM {audit_table}_unpartitioned), now() AT TIME ZONE 'UTC')),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '2 months',
+                    interval '1 month'
+                ) LOOP
+                    EXECUTE 'CREATE TABLE ' || quote_ident('{audit_table}_p' || to_char(month, 'YYYYMM'))
+                        || ' PARTITION OF {audit_table} FOR VALUES FROM (' || quote_literal(month)
+                        || ') TO (' || quote_literal(month + interval '1 month') || ')';
+                END LOOP;
+            END;
+            $$;
+            """
+        )
+        migration.execute(f"INSERT INTO {audit_table} SELECT * FROM {audit_table}_unpartitioned;")
+        migration.drop_table(table_name=f"{audit_table}_unpartitioned")
+
+    migration.update_version_table(version=revision)
+
+
+def downgrade(migration):
+    for table_name in AUDITED_TABLES:
+        audit_table = f"{table_name}_audit"
+        migration.execute(
+            f"""
+            CREATE TABLE {audit_table}_unpartitioned (
+                LIKE {audit_table} INCLUDING DEFAULTS,
+                PRIMARY KEY ("entity_id", "version")
+            );
+            """
+        )
+        # Only the partitioned primary key made changed_on NOT NULL.
+        migration.execute(f'ALTER TABLE {audit_table}_unpartitioned ALTER COLUMN "changed_on" DROP NOT NULL;')
+        migration.execute(
+            f"INSERT INTO {audit_table}_unpartitioned SELECT * FROM {audit_table} ON CONFLICT DO NOTHING;"
+        )
+        migration.drop_table(table_name=audit_table)
+        migration.change_table_name(f"{audit_table}_unpartitioned", audit_table)
+        migration.execute(f"ALTER TABLE {audit_table} RENAME CONSTRAINT {audit_table}_unpartitioned_pkey TO {audit_table}_pkey;")
+
+    migration.update_version_table(version=down_revision)
@@ -1,8 +1,7 @@
 from flask_restx import Namespace, Resource
 from flask import request
 from app.helpers.response import get_success_response, get_failure_response, parse_request_body, validate_required_fields
-from common.app_config import config
-from common.services import AuthService, PersonService
+from app.helpers.container import inject_services
 
 # Create the auth blueprint
 auth_api = Namespace('auth', description="Auth related APIs")
@@ -27,12 +26,11 @@ class Signup(Resource):
             'email_address': {'type': 'string'}
         }}
     )
-    def post(self):
+    @inject_services()
+    def post(self, auth_service):
         parsed_body = parse_request_body(request, ['first_name', 'last_name', 'email_address'])
         validate_required_fields(parsed_body)
 
-        auth_service = AuthService(config)
-
         auth_service.signup(
             parsed_body['email_address'],
             parsed_body['first_name'],
@@ -49,20 +47,19 @@ class Login(Resource):
             'password': {'type': 'string'}
         }}
     )
-    def post(self):
+    @inject_services()
+    def post(self, auth_service, person_service):
         parsed_body = parse_request_body(request, ['email', 'password'])
         validate_required_fields(parsed_body)
 
-        auth_service = AuthService(config)
         access_token, expiry = auth_service.login_user_by_email_password(
             parsed_body['email'], 
             parsed_body['password']
         )
 
-        person_service = PersonService(config)
         person = person_service.get_person_by_email_address(email_address=parsed_body['email'])
 
-        return get_success_response(person=person.as_dict(), access_token=access_token, expiry=expiry)
+        return get_success_response(person=person, access_token=access_token, expiry=expiry)
 
 
 @auth_api.route('/forgot_password', doc=dict(description="Send reset password link"))
@@ -72,11 +69,11 @@ class ForgotPassword(Resource):
             'email': {'type': 'string'}
         }}
     )
-    def post(self):
+    @inject_services()
+    def post(self, auth_service):
         parsed_body = parse_request_body(request, ['email'])
         validate_required_fields(parsed_body)
 
-        auth_service = AuthService(config)
         auth_service.trigger_forgot_password_email(parsed_body.get('email'))
 
         return get_success_response(message="Password reset email sent successfully.")
@@ -92,15 +89,15 @@ class ResetPassword(Resource):
             'password': {'type': 'string'}
         }}
     )
-    def post(self, token, uidb64):
+    @inject_services()
+    def post(self, token, uidb64, auth_service):
         parsed_body = parse_request_body(request, ['password'])
         validate_required_fields(parsed_body)
 
-        auth_service = AuthService(config)
         access_token, expiry, person_obj = auth_service.reset_user_password(token, uidb64, parsed_body.get('password'))
         return get_success_response(
             message="Your password has been updated!", 
             access_token=access_token, 
             expiry=expiry,
-            person=person_obj.as_dict()
+            person=person_obj
         )
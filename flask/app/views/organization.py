@@ -1,9 +1,8 @@
 from flask_restx import Namespace, Resource
 from flask import request
 from app.helpers.response import get_success_response, get_failure_response, parse_request_body, validate_required_fields
-from common.app_config import config
-from common.services import OrganizationService, PersonService
 from app.helpers.decorators import login_required, organization_required
+from app.helpers.container import inject_services
 
 # Create the organization blueprint
 organization_api = Namespace('organization', description="Organization-related APIs")
@@ -12,19 +11,42 @@ organization_api = Namespace('organization', description="Organization-related A
 @organization_api.route('/')
 class Organizations(Resource):
     
+    MAX_PER_PAGE = 500
+
     @login_required()
-    def get(self, person):
-        organization_service = OrganizationService(config)
-        organizations = organization_service.get_organizations_with_roles_by_person(person.entity_id)
-        return get_success_response(organizations=organizations)
+    @organization_api.doc(params={
+        'per_page': 'Number of organizations per page (default: 100, maximum: 500)',
+        'cursor': 'Opaque cursor of the page to fetch. Omit it for the first page, then pass the returned next_cursor.'
+    })
+    @inject_services()
+    def get(self, person, organization_service):
+        """Get the organizations of the logged-in user with their roles, one page at a time"""
+        try:
+            per_page = min(max(int(request.args.get('per_page', 100)), 1), self.MAX_PER_PAGE)
+        except ValueError:
+            per_page = 100
+
+        cursor = request.args.get('cursor') or None
+        organizations, next_cursor = organization_service.get_organizations_page_by_person(
+            person.entity_id, cursor=cursor, per_page=per_page
+        )
+        return get_success_response(
+            organizations=organizations,
+            pagination={
+                'per_page': per_page,
+                'cursor': cursor,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+        )
 
     @login_required()
     @organization_required(with_roles=["admin"])
-    def put(self, organization):
+    @inject_services()
+    def put(self, organization, organization_service):
         parsed_body = parse_request_body(request, ["name"])
         validate_required_fields(parsed_body)
-        
-        organization_service = OrganizationService(config)
+
         organization.name = parsed_body["name"]
         organization_service.save_organization(organization)
 
@@ -1,9 +1,9 @@
 from flask_restx import Namespace, Resource
 from flask import request
-from app.helpers.response import get_success_response, parse_request_body, validate_required_fields
+from app.helpers.response import get_success_response, get_conditional_response, get_etag, parse_request_body, validate_required_fields
 from app.helpers.decorators import login_required
+from app.helpers.container import inject_services
 from common.app_config import config
-from common.services import PersonService
 
 # Create the organization blueprint
 person_api = Namespace('person', description="Person-related APIs")
@@ -14,7 +14,7 @@ class Me(Resource):
     
     @login_required()
     def get(self, person):
-        return get_success_response(person=person)
+        return get_conditional_response(get_etag(person.entity_id, person.version), person=person)
         
     @login_required()
     @person_api.expect(
@@ -23,7 +23,8 @@ class Me(Resource):
             'last_name': {'type': 'string'}
         }}
     )
-    def put(self, person):
+    @inject_services()
+    def put(self, person, email, person_service, auth_service):
         """Update the current user's profile information"""
         parsed_body = parse_request_body(request, ['first_name', 'last_name'])
         
@@ -35,15 +36,21 @@ class Me(Resource):
                 message="No changes provided. Please provide at least first_name or last_name.",
                 person=person
             )
-            
-        person_service = PersonService(config)
+
         updated_person = person_service.update_person_name(
             person.entity_id,
             parsed_body.get('first_name'),
             parsed_body.get('last_name')
         )
-        
+
+        # Tokens carrying a person snapshot would keep serving the old name, so hand out a fresh one.
+        token_data = {}
+        if config.ACCESS_TOKEN_SNAPSHOT:
+            access_token, expiry = auth_service.refresh_access_token(updated_person, email)
+            token_data = dict(access_token=access_token, expiry=expiry)
+
         return get_success_response(
             message="Profile updated successfully.",
-            person=updated_person
+            person=updated_person,
+            **token_data
         )
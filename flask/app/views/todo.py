@@ -1,9 +1,11 @@
 from flask_restx import Namespace, Resource
-from flask import request
-from app.helpers.response import get_success_response, get_failure_response, parse_request_body, validate_required_fields_from_list
+from flask import current_app, request, stream_with_context
+from app.helpers.response import (
+    get_success_response, get_failure_response, get_conditional_response, get_etag, parse_request_body,
+    validate_required_fields_from_list
+)
 from app.helpers.decorators import login_required
-from common.app_config import config
-from common.services import TodoService
+from app.helpers.container import inject_services
 from common.models import Todo
 
 # Create the todo blueprint
@@ -16,12 +18,12 @@ class TodoList(Resource):
     @todo_api.doc(params={
         'status': 'Filter todos by status: "complete" or "incomplete". If not provided, returns all todos.',
         'page': 'Page number for pagination (default: 1)',
-        'per_page': 'Number of todos per page (default: 10)'
+        'per_page': 'Number of todos per page (default: 10)',
+        'cursor': 'Opaque cursor for keyset pagination. Pass an empty value for the first page, then the returned next_cursor. Takes precedence over page.'
     })
-    def get(self, person):
+    @inject_services()
+    def get(self, person, todo_service):
         """Get all todos for the logged-in user with pagination"""
-        todo_service = TodoService(config)
-        
         # Get pagination parameters
         try:
             page = int(request.args.get('page', 1))
@@ -41,43 +43,66 @@ class TodoList(Resource):
         
         # Check if status parameter is provided
         status = request.args.get('status')
+
+        # Keyset pagination when a cursor is given, page numbers otherwise for older clients
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            is_completed = {'completed': True, 'incomplete': False}.get(status)
+            todos, next_cursor = todo_service.get_todos_page_by_person_id(
+                person.entity_id, cursor=cursor, per_page=per_page, is_completed=is_completed
+            )
+            pagination = {
+                'per_page': per_page,
+                'cursor': cursor or None,
+                'next_cursor': next_cursor,
+                'has_next': next_cursor is not None
+            }
+            return get_conditional_response(self._get_list_etag(todos, pagination), todos=todos, pagination=pagination)
         
         # Return data based on status parameter
         if status == 'completed':
             todos = todo_service.get_completed_todos_by_person_id(person.entity_id, page, per_page)
-            total_todos = todo_service.count_completed_todos_by_person_id(person.entity_id)
         elif status == 'incomplete':
             todos = todo_service.get_incomplete_todos_by_person_id(person.entity_id, page, per_page)
-            total_todos = todo_service.count_incomplete_todos_by_person_id(person.entity_id)
         else:
             # Default: return all todos if no valid status parameter is provided
             todos = todo_service.get_todos_by_person_id(person.entity_id, page, per_page)
-            total_todos = todo_service.count_todos_by_person_id(person.entity_id)
 
-        total_all_todos = todo_service.count_todos_by_person_id(person.entity_id)
-        total_completed_todos = todo_service.count_completed_todos_by_person_id(person.entity_id)
-        total_incomplete_todos = todo_service.count_incomplete_todos_by_person_id(person.entity_id)
+        # All totals come from a single aggregate query
+        todo_counts = todo_service.get_todo_counts_by_person_id(person.entity_id)
+        total_all_todos = todo_counts['total']
+        total_completed_todos = todo_counts['completed']
+        total_incomplete_todos = todo_counts['incomplete']
+
+        if status == 'completed':
+            total_todos = total_completed_todos
+        elif status == 'incomplete':
+            total_todos = total_incomplete_todos
+        else:
+            total_todos = total_all_todos
 
-        print(f"Total todos: {todos}")
         # Calculate pagination metadata
         total_pages = (total_todos + per_page - 1) // per_page  # Ceiling division
         has_next = page < total_pages
         has_prev = page > 1
             
-        return get_success_response(
-            todos=[todo.as_dict() for todo in todos],
-            pagination={
-                'page': page,
-                'per_page': per_page,
-                'total_todos': total_todos,
-                'total_completed_todos': total_completed_todos,
-                'total_incomplete_todos': total_incomplete_todos,
-                'total_all_todos': total_all_todos,
-                'total_pages': total_pages,
-                'has_next': has_next,
-                'has_prev': has_prev
-            }
-        )
+        pagination = {
+            'page': page,
+            'per_page': per_page,
+            'total_todos': total_todos,
+            'total_completed_todos': total_completed_todos,
+            'total_incomplete_todos': total_incomplete_todos,
+            'total_all_todos': total_all_todos,
+            'total_pages': total_pages,
+            'has_next': has_next,
+            'has_prev': has_prev
+        }
+        return get_conditional_response(self._get_list_etag(todos, pagination), todos=todos, pagination=pagination)
+
+    @staticmethod
+    def _get_list_etag(todos, pagination):
+        """The todos' versions determine their bodies; the pagination block carries the counts."""
+        return get_etag(*(f"{todo.entity_id}:{todo.version}" for todo in todos), sorted(pagination.items()))
     
     @login_required()
     @todo_api.expect(
@@ -86,28 +111,129 @@ class TodoList(Resource):
             'description': {'type': 'string'}
         }}
     )
-    def post(self, person):
+    @inject_services()
+    def post(self, person, todo_service):
         """Create a new todo for the logged-in user"""
         parsed_body = parse_request_body(request, ['title', 'description'])
         validate_required_fields_from_list(parsed_body, ['title'])
 
-        todo_service = TodoService(config)
         todo = todo_service.save_todo(person.entity_id, parsed_body.get('title'), parsed_body.get('description'))
         
-        return get_success_response(todo=todo.as_dict())
+        return get_success_response(todo=todo)
+
+@todo_api.route('/bulk')
+class TodoBulk(Resource):
+    MAX_OPERATIONS = 500
+
+    @login_required()
+    @todo_api.expect(
+        {'type': 'object', 'properties': {
+            'operations': {'type': 'array', 'items': {'type': 'object', 'properties': {
+                'op': {'type': 'string', 'enum': ['create', 'update', 'delete']},
+                'entity_id': {'type': 'string'},
+                'title': {'type': 'string'},
+                'description': {'type': 'string'},
+                'is_completed': {'type': 'boolean'}
+            }}}
+        }}
+    )
+    @inject_services()
+    def post(self, person, todo_service):
+        """Create, update and delete many todos of the logged-in user in one request"""
+        parsed_body = parse_request_body(request, ['operations'])
+        operations = parsed_body['operations']
+
+        if not isinstance(operations, list) or not operations:
+            return get_failure_response(message="'operations' must be a non-empty list.")
+        if len(operations) > self.MAX_OPERATIONS:
+            return get_failure_response(message=f"At most {self.MAX_OPERATIONS} operations are allowed per request.")
+
+        results = todo_service.apply_bulk_operations(person.entity_id, operations)
+        return get_success_response(results=results)
+
+
+@todo_api.route('/search')
+class TodoSearch(Resource):
+    MAX_PER_PAGE = 100
+
+    @login_required()
+    @todo_api.doc(params={
+        'q': 'Search terms, matched against title and description. Supports "quoted phrases", or, and -excluded words.',
+        'page': 'Page number for pagination (default: 1)',
+        'per_page': 'Number of todos per page (default: 10)'
+    })
+    @inject_services()
+    def get(self, person, todo_service):
+        """Search the todos of the logged-in user, best matches first"""
+        query = request.args.get('q', '').strip()
+        if not query:
+            return get_failure_response(message="'q' is required and cannot be empty.")
+
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+
+        try:
+            per_page = min(max(int(request.args.get('per_page', 10)), 1), self.MAX_PER_PAGE)
+        except ValueError:
+            per_page = 10
+
+        todos, has_next = todo_service.search_todos_by_person_id(person.entity_id, query, page, per_page)
+        return get_success_response(
+            todos=todos,
+            pagination={
+                'page': page,
+                'per_page': per_page,
+                'has_next': has_next,
+                'has_prev': page > 1
+            }
+        )
+
+
+@todo_api.route('/export')
+class TodoExport(Resource):
+    # Bytes of NDJSON collected before a chunk is written to the client
+    CHUNK_SIZE = 64 * 1024
+
+    @login_required()
+    @inject_services()
+    def get(self, person, todo_service):
+        """Stream all todos of the logged-in user as newline delimited JSON, one todo per line"""
+        todos = todo_service.iter_todos_by_person_id(person.entity_id)
+
+        def generate():
+            chunk, size = [], 0
+            for todo in todos:
+                line = current_app.json.dumps(todo) + '\n'
+                chunk.append(line)
+                size += len(line)
+                if size >= self.CHUNK_SIZE:
+                    yield ''.join(chunk)
+                    chunk, size = [], 0
+            if chunk:
+                yield ''.join(chunk)
+
+        # The request context, and with it the pooled DB connection, stays open until the stream ends.
+        return current_app.response_class(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': 'attachment; filename=todos.ndjson'}
+        )
+
 
 @todo_api.route('/<string:todo_id>')
 class TodoItem(Resource):
     @login_required()
-    def get(self, person, todo_id):
+    @inject_services()
+    def get(self, person, todo_id, todo_service):
         """Get a specific todo for the logged-in user"""
-        todo_service = TodoService(config)
         todo = todo_service.get_todo_by_id(todo_id)
         
         if not todo or todo.person_id != person.entity_id:
             return get_failure_response(message="Todo not found or not authorized")
         
-        return get_success_response(todo=todo.as_dict())
+        return get_conditional_response(get_etag(todo.entity_id, todo.version), todo=todo)
     
     @login_required()
     @todo_api.expect(
@@ -117,9 +243,9 @@ class TodoItem(Resource):
             'is_completed': {'type': 'boolean'}
         }}
     )
-    def put(self, person, todo_id):
+    @inject_services()
+    def put(self, person, todo_id, todo_service):
         """Update a specific todo for the logged-in user"""
-        todo_service = TodoService(config)
         todo = todo_service.get_todo_by_id(todo_id)
 
         if not todo or todo.person_id != person.entity_id:
@@ -134,12 +260,12 @@ class TodoItem(Resource):
             todo.is_completed = parsed_body['is_completed']
          
         todo = todo_service.save_todo_object(todo)
-        return get_success_response(todo=todo.as_dict())
+        return get_success_response(todo=todo)
     
     @login_required()
-    def delete(self, person, todo_id):
+    @inject_services()
+    def delete(self, person, todo_id, todo_service):
         """Delete a specific todo for the logged-in user"""
-        todo_service = TodoService(config)
         todo = todo_service.get_todo_by_id(todo_id)
         
         if not todo or todo.person_id != person.entity_id:
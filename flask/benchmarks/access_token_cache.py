@@ -0,0 +1,46 @@
+"""
+Benchmark of the per-request access token check with and without the verified-token cache.
+
+Every authenticated request calls AuthService.parse_access_token; clients reuse the same token, so
+the cache turns an HS256 verification into a digest and a dict lookup.
+
+Run from the flask directory: python -m benchmarks.access_token_cache
+"""
+import argparse
+import time
+
+from common.app_config import config
+from common.models import LoginMethod
+from common.services import AuthService
+
+
+def _run(auth_service: AuthService, tokens: list, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        assert auth_service.parse_access_token(tokens[i % len(tokens)])
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50000)
+    parser.add_argument('--clients', type=int, default=100, help="Number of distinct tokens in use")
+    args = parser.parse_args()
+
+    uncached_config = config.model_copy(update={'ACCESS_TOKEN_CACHE_MAXSIZE': 0})
+    uncached = AuthService(uncached_config)
+    cached = AuthService(config)
+
+    tokens = [
+        uncached.generate_access_token(LoginMethod(email_id=f"{i:032x}", person_id=f"{i:032x}"))[0]
+        for i in range(args.clients)
+    ]
+
+    print(f"{args.requests} requests over {args.clients} tokens")
+    print(f"without cache: {_run(uncached, tokens, args.requests):8.2f} us/request")
+    print(f"with cache:    {_run(cached, tokens, args.requests):8.2f} us/request")
+    print(f"cache stats:   {cached.access_token_cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark of the write throughput of the audit strategies (AUDIT_STRATEGY).
+
+Updates existing todos, so every save also writes an audit row, with single saves and with `save_many`
+batches. Needs the database of the current environment migrated to the latest version; the todos it
+creates belong to a new person.
+
+For the deferred strategy the time to flush the buffered audit rows is reported separately, since it
+is spent off the request path.
+
+Run from the flask directory: python -m benchmarks.audit_strategy
+"""
+import argparse
+import time
+
+from common.app_config import config
+from common.models import Person, Todo
+from common.repositories.audit import STRATEGIES, get_deferred_audit_writer
+from common.repositories.factory import RepositoryFactory, RepoType
+
+
+def _run(repository, todos: list, rounds: int, batch_size: int) -> dict:
+    writer = get_deferred_audit_writer()
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        for todo in todos:
+            todo.is_completed = i % 2 == 0
+            repository.save(todo)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        for todo in todos:
+            todo.is_completed = i % 2 == 1
+        for start_index in range(0, len(todos), batch_size):
+            repository.save_many(todos[start_index:start_index + batch_size])
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    writer.flush()
+    flush = time.perf_counter() - start
+
+    saves = rounds * len(todos)
+    return {'single': saves / single, 'batched': saves / batched, 'flush_ms': flush * 1e3}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--todos', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=50)
+    args = parser.parse_args()
+
+    factory = RepositoryFactory(config)
+    person = factory.get_repository(RepoType.PERSON).save(Person(first_name='Audit', last_name='Benchmark'))
+    repository = factory.get_repository(RepoType.TODO, person_id=person.entity_id)
+    todos = repository.save_many([Todo(person_id=person.entity_id, title=f'Todo {i}') for i in range(args.todos)])
+
+    print(f"{args.todos} todos, {args.rounds} rounds of updates, save_many batches of {args.batch_size}")
+    for strategy in STRATEGIES:
+        config.AUDIT_STRATEGY = strategy
+        result = _run(repository, todos, args.rounds, args.batch_size)
+        print(
+            f"{strategy:9} single saves: {result['single']:8.0f}/s  save_many: {result['batched']:8.0f}/s  "
+            f"audit flush: {result['flush_ms']:7.1f} ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
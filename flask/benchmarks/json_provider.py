@@ -0,0 +1,73 @@
+"""
+Benchmark of the JSON serialization of a 100 item `GET /todo/` page.
+
+Compares the previous path (`as_dict()` per todo, then Flask's default provider) with the providers of
+`app.helpers.json_provider`, which take the models directly. The orjson provider is skipped when the
+orjson package is not installed. Every provider must produce the same JSON as the previous path.
+
+Run from the flask directory: python -m benchmarks.json_provider
+"""
+import argparse
+import json
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.helpers.json_provider import ModelJSONProvider, OrjsonProvider, orjson
+from common.models import Todo
+
+
+def _page(todos: list) -> dict:
+    return dict(
+        success=True,
+        todos=todos,
+        pagination={'page': 1, 'per_page': len(todos), 'total_todos': 1000, 'total_pages': 10, 'has_next': True}
+    )
+
+
+def _run(dumps, page: dict, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        dumps(page)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    todos = [
+        Todo(person_id='0' * 32, title=f'Todo {i}', description='Lorem ipsum dolor sit amet ' * 3, is_completed=i % 2 == 0)
+        for i in range(args.items)
+    ]
+
+    default_provider = DefaultJSONProvider(app)
+    expected = json.loads(default_provider.dumps(_page([todo.as_dict() for todo in todos])))
+
+    results = {
+        'as_dict + default provider': _run(
+            lambda page: default_provider.dumps(_page([todo.as_dict() for todo in page['todos']])),
+            _page(todos), args.iterations
+        ),
+    }
+    providers = {'models + json provider': ModelJSONProvider(app)}
+    if orjson is not None:
+        providers['models + orjson provider'] = OrjsonProvider(app)
+
+    for name, provider in providers.items():
+        if json.loads(provider.dumps(_page(todos))) != expected:
+            raise AssertionError(f"{name} does not produce the same JSON as the default provider")
+        results[name] = _run(provider.dumps, _page(todos), args.iterations)
+
+    print(f"{args.items} todos per page, {args.iterations} iterations")
+    baseline = results['as_dict + default provider']
+    for name, us_per_page in results.items():
+        print(f"{name:28} {us_per_page:10.1f} us/page  {baseline / us_per_page:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark of MessageSender per-message latency: a new connection per message versus the pooled channels,
+and send_many batches, plus the body size of every message encoding.
+
+A minimal in-process AMQP 0-9-1 stand-in broker answers the handshake, declarations and publishes (and
+publisher confirms and transactions) over loopback, so the numbers isolate the client-side cost of the connection handling.
+`--latency-ms` delays every broker reply to approximate a network round trip.
+
+Run from the flask directory: python -m benchmarks.message_sender
+"""
+import argparse
+import json
+import socket
+import socketserver
+import threading
+import time
+
+import pika
+from pika import frame, spec
+
+from common.tasks.message_encoding import ENCODINGS, encode_message, msgpack
+from common.tasks.send_message import ChannelPool, MessageSender, establish_connection
+
+
+class StandInBrokerHandler(socketserver.BaseRequestHandler):
+    """Speaks just enough AMQP 0-9-1 for pika to connect, declare, publish, get confirms and commit transactions."""
+
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.delivery_tags = {}
+
+    def reply(self, channel_number: int, method):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.request.sendall(frame.Method(channel_number, method).marshal())
+
+    def handle(self):
+        buffer = b''
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            buffer += data
+            while buffer:
+                consumed, received = frame.decode_frame(buffer)
+                if not received:
+                    break
+                buffer = buffer[consumed:]
+                if self.on_frame(received) is False:
+                    return
+
+    def on_frame(self, received):
+        if isinstance(received, frame.ProtocolHeader):
+            return self.reply(0, spec.Connection.Start(server_properties={
+                'product': 'stand-in', 'capabilities': {'publisher_confirms': True, 'basic.nack': True}
+            }))
+        if isinstance(received, frame.Body):
+            if received.channel_number in self.delivery_tags:
+                self.delivery_tags[received.channel_number] += 1
+                self.reply(received.channel_number, spec.Basic.Ack(self.delivery_tags[received.channel_number]))
+            return
+        if not isinstance(received, frame.Method):
+            return
+
+        channel_number, method = received.channel_number, received.method
+        if isinstance(method, spec.Connection.StartOk):
+            self.reply(0, spec.Connection.Tune(channel_max=2047, frame_max=131072, heartbeat=60))
+        elif isinstance(method, spec.Connection.Open):
+            self.reply(0, spec.Connection.OpenOk())
+        elif isinstance(method, spec.Connection.Close):
+            self.reply(0, spec.Connection.CloseOk())
+            return False
+        elif isinstance(method, spec.Channel.Open):
+            self.reply(channel_number, spec.Channel.OpenOk())
+        elif isinstance(method, spec.Channel.Close):
+            self.reply(channel_number, spec.Channel.CloseOk())
+        elif isinstance(method, spec.Confirm.Select):
+            self.delivery_tags[channel_number] = 0
+            self.reply(channel_number, spec.Confirm.SelectOk())
+        elif isinstance(method, spec.Tx.Select):
+            self.reply(channel_number, spec.Tx.SelectOk())
+        elif isinstance(method, spec.Tx.Commit):
+            self.reply(channel_number, spec.Tx.CommitOk())
+        elif isinstance(method, spec.Exchange.Declare):
+            self.reply(channel_number, spec.Exchange.DeclareOk())
+        elif isinstance(method, spec.Queue.Declare):
+            self.reply(channel_number, spec.Queue.DeclareOk(queue=method.queue, message_count=0, consumer_count=0))
+
+
+class StandInBroker(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency: float = 0):
+        super().__init__(('127.0.0.1', 0), StandInBrokerHandler)
+        self.latency = latency
+
+
+def send_with_new_connection(parameters: pika.ConnectionParameters, queue_name: str, data: dict):
+    """The previous MessageSender.send_message: connect, declare, publish and close for every message."""
+    connection = establish_connection(parameters)
+    with connection:
+        channel = connection.channel()
+        channel.queue_declare(queue=queue_name, durable=True)
+        channel.basic_publish(
+            exchange='', routing_key=queue_name, body=json.dumps(data).encode(),
+            properties=pika.BasicProperties(delivery_mode=2)
+        )
+
+
+def _message(index: int) -> dict:
+    return {'event': 'USER_CREATED', 'index': index, 'email': f'user{index}@example.com', 'first_name': 'Test'}
+
+
+def _run(send, messages: int) -> float:
+    start = time.perf_counter()
+    for i in range(messages):
+        send('email-transmitter', _message(i))
+    return (time.perf_counter() - start) / messages * 1e6
+
+
+def _run_batches(sender: MessageSender, messages: int, batch_size: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, messages, batch_size):
+        sender.send_many('email-transmitter', [_message(i) for i in range(offset, min(offset + batch_size, messages))])
+    return (time.perf_counter() - start) / messages * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=0, help="Delay of every stand-in broker reply")
+    parser.add_argument('--batch-size', type=int, default=100, help="Messages per send_many call")
+    args = parser.parse_args()
+
+    broker = StandInBroker(latency=args.latency_ms / 1000)
+    threading.Thread(target=broker.serve_forever, daemon=True).start()
+    parameters = pika.ConnectionParameters(host='127.0.0.1', port=broker.server_address[1])
+
+    print(f"{args.messages} messages, {args.latency_ms} ms broker latency")
+    per_message = _run(lambda queue_name, data: send_with_new_connection(parameters, queue_name, data), args.messages)
+    print(f"new connection per message: {per_message:10.2f} us/message")
+
+    for publisher_confirms in (False, True):
+        pool = ChannelPool(parameters, size=1, publisher_confirms=publisher_confirms)
+        per_message = _run(MessageSender(pool).send_message, args.messages)
+        pool.close()
+        print(f"pooled channel{' + confirms' if publisher_confirms else '':<12}: {per_message:10.2f} us/message")
+
+    for publisher_confirms in (False, True):
+        pool = ChannelPool(parameters, size=1, publisher_confirms=publisher_confirms)
+        per_message = _run_batches(MessageSender(pool), args.messages, args.batch_size)
+        pool.close()
+        print(f"send_many{' + confirms' if publisher_confirms else '':<17}: {per_message:10.2f} us/message")
+
+    for encoding, (content_type, content_encoding) in ENCODINGS.items():
+        if content_type.endswith('msgpack') and msgpack is None:
+            continue
+        print(f"{encoding} body: {len(encode_message(_message(0), content_type, content_encoding))} bytes")
+
+    broker.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Microbenchmark for repository construction per request.
+
+Simulates the repositories one authenticated `GET /todo/` builds (AuthService, EmailService and
+PersonService in `login_required`, then TodoService) and compares building them from scratch
+with the process-wide `RepositoryRegistry`.
+
+Run from the flask directory: python -m benchmarks.repository_factory
+"""
+import argparse
+import time
+
+from common.app_config import config
+from common.repositories.factory import RepositoryFactory, RepositoryRegistry, RepoType
+
+# Repositories constructed for one authenticated todo request.
+REQUEST_REPOSITORIES = [
+    RepoType.EMAIL, RepoType.PERSON,  # AuthService -> PersonService
+    RepoType.EMAIL, RepoType.LOGIN_METHOD, RepoType.ORGANIZATION, RepoType.PERSON_ORGANIZATION_ROLE,  # AuthService
+    RepoType.EMAIL,  # EmailService
+    RepoType.EMAIL, RepoType.PERSON,  # PersonService
+    RepoType.TODO,  # TodoService
+]
+
+
+class CountingRepositoryFactory(RepositoryFactory):
+    db_adapters = 0
+    message_adapters = 0
+
+    def get_db_connection(self):
+        CountingRepositoryFactory.db_adapters += 1
+        return super().get_db_connection()
+
+    def get_adapter(self):
+        CountingRepositoryFactory.message_adapters += 1
+        return super().get_adapter()
+
+
+def _run(build_repository, requests: int):
+    CountingRepositoryFactory.db_adapters = 0
+    CountingRepositoryFactory.message_adapters = 0
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        for repo_type in REQUEST_REPOSITORIES:
+            build_repository(CountingRepositoryFactory(config), repo_type)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'us_per_request': elapsed / requests * 1e6,
+        'db_adapters_per_request': CountingRepositoryFactory.db_adapters / requests,
+        'message_adapters_per_request': CountingRepositoryFactory.message_adapters / requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    RepositoryRegistry.clear()
+    results = {
+        'before (per-call construction)': _run(
+            lambda factory, repo_type: factory.create_repository(repo_type, person_id='0' * 32), args.requests
+        ),
+        'after (registry)': _run(
+            lambda factory, repo_type: factory.get_repository(repo_type, person_id='0' * 32), args.requests
+        ),
+    }
+
+    print(f"{len(REQUEST_REPOSITORIES)} repositories per request, {args.requests} requests")
+    for name, result in results.items():
+        print(
+            f"{name:32} {result['us_per_request']:10.1f} us/request  "
+            f"db adapters/request: {result['db_adapters_per_request']:.3f}  "
+            f"message adapters/request: {result['message_adapters_per_request']:.3f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark of the response compression trade-off: CPU time per response versus bytes on the wire.
+
+Compresses representative JSON bodies, serialized the way the response helpers do, with every available
+encoding (gzip, plus br and zstd when the brotli and zstandard packages are installed) at several levels.
+
+Run from the flask directory: python -m benchmarks.response_compression
+"""
+import argparse
+import time
+
+from flask import Flask
+
+from app.helpers.compression import CODECS, compress
+from app.helpers.json_provider import get_json_provider_class
+from common.app_config import config
+from common.models import Organization, Person, Todo
+
+LEVELS = {
+    'gzip': [1, 6, 9],
+    'br': [1, 4, 9, 11],
+    'zstd': [1, 3, 9, 19],
+}
+
+
+def _payloads(app: Flask) -> dict:
+    person = Person(first_name='Ada', last_name='Lovelace')
+    todos = [
+        Todo(
+            person_id=person.entity_id, title=f'Todo {i}', is_completed=i % 3 == 0,
+            description=f'Follow up on item {i}: ' + 'collect the notes from the review and update the plan. ' * 4
+        )
+        for i in range(100)
+    ]
+    organizations = [
+        {'entity_id': Organization().entity_id, 'name': f'Organization {i}', 'code': f'ORG{i:04d}', 'role': 'member'}
+        for i in range(500)
+    ]
+    return {
+        'person': app.json.dumps(dict(success=True, person=person)).encode(),
+        'todo page (100)': app.json.dumps(dict(success=True, todos=todos)).encode(),
+        'organizations (500)': app.json.dumps(dict(success=True, organizations=organizations)).encode(),
+    }
+
+
+def _run(data: bytes, encoding: str, level: int, iterations: int) -> tuple:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        compressed = compress(data, encoding, level)
+    return (time.perf_counter() - start) / iterations * 1e6, len(compressed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.json = get_json_provider_class(config.JSON_PROVIDER)(app)
+
+    print(f"encodings: {', '.join(CODECS)}; responses under COMPRESSION_MIN_SIZE={config.COMPRESSION_MIN_SIZE} bytes are sent as is")
+    for name, data in _payloads(app).items():
+        print(f"\n{name}: {len(data)} bytes")
+        for encoding in CODECS:
+            for level in LEVELS[encoding]:
+                us, size = _run(data, encoding, level, args.iterations)
+                print(
+                    f"  {encoding:4} level {level:2}: {size:7} bytes  {len(data) / size:5.1f}x smaller  "
+                    f"{us:9.1f} us  {len(data) / us:6.1f} MB/s"
+                )
+
+
+if __name__ == '__main__':
+    main()